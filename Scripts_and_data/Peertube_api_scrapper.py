@@ -1,7 +1,14 @@
 import requests
 import csv
+import http_client
+import stream_store
+import stream_rollups
+from peertube_live import find_live_videos
 import time
-from urllib.parse import urlparse
+import heapq
+import random
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse, parse_qs
 from datetime import datetime, timezone
 import os
 
@@ -19,64 +26,90 @@ CHANNEL_URLS = [
 ]
 PEERTUBE_CSV_FILE = "DATA/peertube_data.csv"
 OUTPUT_CSV_FILE = "DATA/peertube_data2.csv"
+LIVE_MAX_AGE_HOURS = None  # Stop paginating past videos older than this, None = derive from the longest recorded session
+LIVE_MIN_AGE_HOURS = 24  # Lower bound for the derived cutoff
+LIVE_AGE_MARGIN = 1.5  # Multiplier applied to the longest recorded session
+METADATA_MAX_WORKERS = 8  # Max number of video metadata requests in flight
+METADATA_MAX_RETRIES = 3  # Retries per video after a timeout
+METADATA_RETRY_DELAY = 5  # Base retry delay in seconds, doubled per retry with jitter
+METADATA_MAX_AGE = 7 * 86400  # Only refresh videos retrieved within this many seconds
 
-def read_csv_rows():
-    """Read all rows from peertube_data.csv, skipping the header."""
-    rows = []
+def read_recent_rows():
+    """Read the rows of peertube_data.csv retrieved within METADATA_MAX_AGE from the store."""
+    since = datetime.fromtimestamp(time.time() - METADATA_MAX_AGE, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return stream_store.load_peertube_samples(since)
+
+def fetch_video_metadata(video_url):
+    """Fetch video metadata once. Returns (metadata, retryable), retryable is True on timeouts."""
+    if "/videos/watch/" not in video_url:
+        print(f"Invalid video URL: {video_url}")
+        return None, False
     try:
-        with open(PEERTUBE_CSV_FILE, "r") as f:
-            reader = csv.reader(f)
-            next(reader, None)  # Skip header
-            for row in reader:
-                if len(row) < 5:
-                    continue
-                rows.append({
-                    "csv_retrieval_time": row[0],
-                    "csv_account": row[1],
-                    "video_url": row[2],
-                    "csv_published_at": row[3],
-                    "csv_views": row[4]
-                })
-    except FileNotFoundError:
-        print(f"File {PEERTUBE_CSV_FILE} not found.")
-    return rows
-
-def fetch_video_metadata(video_url, retrieval_time_str, max_retries=3, delay=5):
-    """Fetch video metadata only if retrieval time is less than 1 day old."""
-    retrieval_time = parse_iso_datetime(retrieval_time_str)
-    if not retrieval_time:
-        print(f"Invalid retrieval time: {retrieval_time_str}")
-        return None
+        base_url, video_id = video_url.rsplit("/videos/watch/", 1)
+        api_url = f"{base_url}/api/v1/videos/{video_id}"
+        response = http_client.get(api_url, timeout=10)
+        response.raise_for_status()
+        return response.json(), False
+    except requests.RequestException as e:
+        print(f"Error fetching {video_url}: {e}")
+        return None, "timed out" in str(e)
 
-    # Check if entry is older than 1 day
+def get_recent_video_urls(rows):
+    """Return the unique video URLs that have a retrieval time within METADATA_MAX_AGE."""
     current_time = datetime.now(timezone.utc)
-    time_diff = current_time - retrieval_time
-    if time_diff.total_seconds() > 7*86400:
-        #print(f"Skipping outdated entry ({time_diff} old): {video_url}")
-        return None
+    video_urls = {}
+    for row in rows:
+        retrieval_time_str = row["csv_retrieval_time"]
+        retrieval_time = parse_iso_datetime(retrieval_time_str)
+        if not retrieval_time:
+            print(f"Invalid retrieval time: {retrieval_time_str}")
+            continue
+        if (current_time - retrieval_time).total_seconds() <= METADATA_MAX_AGE:
+            video_urls[row["video_url"]] = True
+    return list(video_urls)
 
-    retries = 0
-    while retries < max_retries:
-        try:
-            if "/videos/watch/" in video_url:
-                base_url, video_id = video_url.rsplit("/videos/watch/", 1)
-                api_url = f"{base_url}/api/v1/videos/{video_id}"
-                response = requests.get(api_url, timeout=10)
-                response.raise_for_status()
-                return response.json()
-            else:
-                print(f"Invalid video URL: {video_url}")
-                return None
-        except requests.RequestException as e:
-            print(f"Error fetching {video_url}: {e}")
-            if "timed out" in str(e):
-                retries += 1
-                print(f"Retrying in {delay}s ({retries}/{max_retries})")
-                time.sleep(delay)
-            else:
-                return None
-    print(f"Failed after {max_retries} retries: {video_url}")
-    return None
+def refresh_video_metadata(video_urls, max_workers=METADATA_MAX_WORKERS, max_retries=METADATA_MAX_RETRIES,
+                           delay=METADATA_RETRY_DELAY):
+    """
+    Fetch metadata for every video URL in parallel and return {video_url: metadata}.
+
+    Each URL has at most one request in flight. Timed out requests are put back on a
+    retry schedule with jittered exponential backoff instead of sleeping, so the
+    workers keep serving other videos while a slow instance waits for its retry.
+    """
+    results = {}
+    in_flight = {}  # future -> (video_url, attempt)
+    retry_schedule = []  # heap of (ready_at, video_url, attempt)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for video_url in dict.fromkeys(video_urls):
+            in_flight[executor.submit(fetch_video_metadata, video_url)] = (video_url, 0)
+
+        while in_flight or retry_schedule:
+            now = time.monotonic()
+            while retry_schedule and retry_schedule[0][0] <= now:
+                _, video_url, attempt = heapq.heappop(retry_schedule)
+                in_flight[executor.submit(fetch_video_metadata, video_url)] = (video_url, attempt)
+
+            timeout = max(0, retry_schedule[0][0] - now) if retry_schedule else None
+            if not in_flight:
+                time.sleep(timeout)
+                continue
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                video_url, attempt = in_flight.pop(future)
+                metadata, retryable = future.result()
+                if metadata:
+                    results[video_url] = metadata
+                elif retryable and attempt < max_retries:
+                    retry_in = delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+                    print(f"Retrying {video_url} in {retry_in:.1f}s ({attempt + 1}/{max_retries})")
+                    heapq.heappush(retry_schedule, (time.monotonic() + retry_in, video_url, attempt + 1))
+                elif retryable:
+                    print(f"Failed after {max_retries} retries: {video_url}")
+
+    return results
 
 def parse_iso_datetime(time_str):
     """Convert ISO string to timezone-aware datetime object."""
@@ -90,6 +123,8 @@ def parse_iso_datetime(time_str):
 def write_entries_to_csv(entries):
     """Write processed entries to peertube_data2.csv."""
     fieldnames = ["account_url", "published_at", "retrieval_time", "views", "video_url"]
+    # Store first: its one-time CSV import must not see the rows written below
+    stream_rollups.update_buckets(stream_store.upsert_peertube_sessions(entries.values()))
     with open(OUTPUT_CSV_FILE, "w", newline="") as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
@@ -105,30 +140,87 @@ def extract_username_and_instance(channel_url):
 
 def save_to_csv(data):
     """Append live stream data to CSV."""
+    # Store first, else the store's one-time CSV import would pick up this row and it'd be inserted twice
+    stream_store.add_peertube_sample(*data)
     with open(PEERTUBE_CSV_FILE, 'a', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
         writer.writerow(data)
 
-def search_live_streams(channel_url):
-    """Check for live streams and save to CSV."""
+def save_live_video(instance_url, username, video, retrieval_time):
+    """Save one live video row to CSV."""
+    video_uuid = video.get("uuid", "N/A")
+    published_at = video.get("publishedAt", "N/A")
+    views = video.get("views", 0)
+    live_data = [
+        retrieval_time,
+        username,
+        f"{instance_url}/videos/watch/{video_uuid}",
+        published_at,
+        views
+    ]
+    save_to_csv(live_data)
+    print(f"🔴 Live: {video.get('name', 'Unnamed')}")
+    print(f"URL: {instance_url}/videos/watch/{video_uuid}")
+    print("-" * 80)
+
+def check_live_streams(channel_urls):
+    """Find live streams with one query per instance, falling back to search_live_streams per account."""
+    retrieval_time = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    live_by_account, failed_accounts, requests_made = find_live_videos(channel_urls)
+    print(f"Checked {len(channel_urls) - len(failed_accounts)} channels with {requests_made} instance queries")
+    max_age_seconds = get_live_age_cutoff() if failed_accounts else None
+
+    for channel_url in channel_urls:
+        print(f"\nChecking {channel_url}")
+        if channel_url in failed_accounts:
+            pages = search_live_streams(channel_url, max_age_seconds)
+            print(f"Fetched {pages} page(s) for {channel_url}")
+            continue
+
+        instance_url, username = extract_username_and_instance(channel_url)
+        videos = live_by_account.get(channel_url, [])
+        for video in videos:
+            save_live_video(instance_url, username, video, retrieval_time)
+        if not videos:
+            print("⚫ No active livestreams")
+
+def get_live_age_cutoff():
+    """Return the max age (seconds) a video can have and still be live, based on the longest recorded session."""
+    if LIVE_MAX_AGE_HOURS is not None:
+        return LIVE_MAX_AGE_HOURS * 3600
+
+    longest = stream_store.longest_peertube_session()
+    return max(LIVE_MIN_AGE_HOURS * 3600, longest * LIVE_AGE_MARGIN)
+
+def search_live_streams(channel_url, max_age_seconds=None):
+    """
+    Check for live streams and save to CSV. Returns the number of pages fetched.
+
+    Videos are sorted newest first, so with max_age_seconds set the pagination stops
+    at the first page that reaches videos published longer ago than any live stream
+    could have been running. Without it every page is walked.
+    """
     instance_url, username = extract_username_and_instance(channel_url)
     url = f"{instance_url}/api/v1/accounts/{username}/videos"
     params = {"count": 50, "start": 0, "sort": "-publishedAt"}
     live_found = False
     retrieval_time = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    now = datetime.now(timezone.utc)
+    pages = 0
 
     try:
         while url:
-            response = requests.get(url, params=params)
+            response = http_client.get(url, params=params)
+            pages += 1
             if response.status_code != 200:
                 print(f"HTTP Error {response.status_code}: {response.text}")
-                return
+                return pages
 
             try:
                 data = response.json()
             except ValueError as e:
                 print(f"JSON Error: {e} - {response.text}")
-                return
+                return pages
 
             videos = data.get("data", [])
             next_page = data.get("paging", {}).get("next", None)
@@ -136,54 +228,53 @@ def search_live_streams(channel_url):
             for video in videos:
                 if video.get("isLive", False):
                     live_found = True
-                    video_uuid = video.get("uuid", "N/A")
-                    published_at = video.get("publishedAt", "N/A")
-                    views = video.get("views", 0)
-                    live_data = [
-                        retrieval_time,
-                        username,
-                        f"{instance_url}/videos/watch/{video_uuid}",
-                        published_at,
-                        views
-                    ]
-                    save_to_csv(live_data)
-                    print(f"🔴 Live: {video.get('name', 'Unnamed')}")
-                    print(f"URL: {instance_url}/videos/watch/{video_uuid}")
-                    print("-" * 80)
+                    save_live_video(instance_url, username, video, retrieval_time)
             
-            url = next_page if next_page else None
-            params["start"] = next_page.split("start=")[-1] if next_page else 0
+            if max_age_seconds is not None and videos:
+                oldest = parse_iso_datetime(videos[-1].get("publishedAt", ""))
+                if oldest and (now - oldest).total_seconds() > max_age_seconds:
+                    break  # Everything after this page is even older
+
+            if next_page:
+                # Keep the base url and take the offset from the link, so start stays an int
+                # and isn't sent twice. Links without an offset are followed as they are.
+                start = parse_qs(urlparse(next_page).query).get("start")
+                if start and params is not None:
+                    params["start"] = int(start[0])
+                else:
+                    url, params = next_page, None
+            elif params and videos and params["start"] + len(videos) < data.get("total", 0):
+                params["start"] += len(videos)
+            else:
+                url = None
 
         if not live_found:
             print("⚫ No active livestreams")
         
     except requests.RequestException as e:
         print(f"Request failed: {e}")
+    return pages
 
 def main():
     """Process CSV data and update entries."""
-    rows = read_csv_rows()
+    rows = read_recent_rows()
     entries = {}
-    api_cache = {}
     channel_url_map = {}
 
     for url in CHANNEL_URLS:
         _, username = extract_username_and_instance(url)
         channel_url_map[username] = url
+
+    metadata_by_url = refresh_video_metadata(get_recent_video_urls(rows))
     
     for row in rows:
         video_url = row["video_url"]
         csv_account = row["csv_account"]
         retrieval_time_str = row["csv_retrieval_time"]
 
-        if video_url in api_cache:
-            metadata = api_cache[video_url]
-        else:
-            metadata = fetch_video_metadata(video_url, retrieval_time_str)
-            if metadata:
-                api_cache[video_url] = metadata
-            else:
-                continue
+        metadata = metadata_by_url.get(video_url)
+        if not metadata:
+            continue
 
         account_url = channel_url_map.get(csv_account, "N/A")
         data_to_write = {
@@ -230,9 +321,7 @@ if __name__ == "__main__":
 
     # Main execution loop
     #while True:
-    for channel_url in CHANNEL_URLS:
-        print(f"\nChecking {channel_url}")
-        search_live_streams(channel_url)
+    check_live_streams(CHANNEL_URLS)
         
     print("\nProcessing data...")
     main()
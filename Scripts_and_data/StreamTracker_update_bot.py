@@ -1,23 +1,25 @@
 import os
-import time
 import requests
 import csv
-from mastodon import Mastodon
+import http_client
+import posted_registry
+import outbox
+import hashtag_cache
+from peertube_live import find_live_videos
 from dotenv import load_dotenv
 import ollama
 import random
 import re
 import platform
-from streamer_mastodon_account import STREAM_TO_MASTODON_ACCOUNT,access_token,mastodon_instance  # Import the dictionary
+from streamer_mastodon_account import STREAM_TO_MASTODON_ACCOUNT  # Import the dictionary
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Mastodon API
-mastodon = Mastodon(access_token=access_token, api_base_url=mastodon_instance)
-
-# CSV file for tracking posted videos and streams
-CSV_FILE = "DATA/live_streams_posted.csv"
+# CSV file for tracking posted videos and streams, absolute since the outbox sender
+# appends to it from a background thread after main.py restored its working directory
+CSV_FILE = os.path.abspath("DATA/live_streams_posted.csv")
+OUTBOX_EXIT_TIMEOUT = 60  # Seconds a run that started the outbox sender waits for queued toots
 
 # List of tracked PeerTube accounts.  This should now be the full account URL.
 USER_URLS = [
@@ -64,55 +66,29 @@ DEFAULT_ACCOUNT = "Streamer <3"
 
 # Load posted streams
 def load_posted_streams():
-    """Read the CSV file and return a set of all (URL, timestamp) tuples."""
+    """Return the posted (URL, timestamp) registry, loaded once per process and updated in place."""
     posted_streams = set()
-    if not os.path.exists(CSV_FILE):
-        print("No CSV file found, starting fresh.")
-        return posted_streams
-
     try:
-        with open(CSV_FILE, mode="r", newline="", encoding="utf-8") as file: # ADD encoding='utf-8'
-            reader = csv.reader(file)
-            for row in reader:
-                if len(row) == 2:
-                    url, timestamp = row
-                    posted_streams.add((url, timestamp))
-                elif len(row) == 1:
-                    posted_streams.add(row[0]) #handles old CSV files without timestamps
-                else:
-                    print(f"Skipping malformed row: {row}")
-
+        posted_streams = posted_registry.get_posted_streams()
         print(f"Loaded {len(posted_streams)} previously posted streams.")
     except Exception as e:
-        print(f"Error loading posted streams from CSV: {e}")
-    return posted_streams
-
-
-def save_posted_stream(url, timestamp):
-    """Append a new stream's URL and timestamp to the CSV file."""
-    try:
-        with open(CSV_FILE, mode="a", newline="", encoding="utf-8") as file: # ADD encoding='utf-8'
-            writer = csv.writer(file)
-            writer.writerow([url, timestamp])
-        print(f"Saved new stream: {url}, {timestamp}")
-    except Exception as e:
-        pass  #print(f"Error saving stream to CSV: {e}")
-
+        print(f"Error loading posted streams from the store: {e}")
     return posted_streams
 
 # Save new posted streams
 def save_posted_stream(url, timestamp):
-    """Append a new stream's URL and timestamp to the CSV file."""
+    """Append a new stream's URL and timestamp to the CSV file and the posted registry."""
     try:
         with open(CSV_FILE, mode="a", newline="", encoding="utf-8") as file:
             writer = csv.writer(file)
             writer.writerow([url, timestamp])
+        posted_registry.mark_posted(url, timestamp)
         print(f"Saved new stream: {url}, {timestamp}")
     except Exception as e:
         pass  #print(f"Error saving stream to CSV: {e}")
 
 
-# Generate description using Ollama
+# Generate description using Ollama, called through hashtag_cache so repeated titles skip the model
 def generate_mastodon_hashtags(video_title):
     """Use Ollama model to generate relevant hashtags for a live stream."""
     try:
@@ -195,6 +171,12 @@ def get_live_streams_from_peertube():
     """Fetch live PeerTube videos and post to Mastodon if not already posted."""
     posted_streams = load_posted_streams()
     generated_descriptions = {}
+    requests_saved = 0  # Per-video lookups avoided thanks to the isLive flag in the listing
+    fallback_lookups = 0  # Per-video lookups still needed because the listing had no isLive flag
+
+    # One "currently live" query per instance, matched back to the tracked accounts
+    live_by_account, failed_accounts, instance_requests = find_live_videos(USER_URLS)
+    account_listings = 0
 
     for account_url in USER_URLS:  # Iterate through the list of account URLs
         # Extract instance, account name, and channel name from the URL
@@ -213,9 +195,14 @@ def get_live_streams_from_peertube():
         #print(f"Checking {instance} for live streams from account: {account_name}...")
 
         try:
-            response = requests.get(api_url, timeout=10)
-            response.raise_for_status()
-            videos = response.json().get('data') or response.json().get('videos')  # Handle different API responses
+            if account_url in failed_accounts:
+                # The instance query failed, fall back to this account's own listing
+                response = http_client.get(api_url, timeout=10)
+                account_listings += 1
+                response.raise_for_status()
+                videos = response.json().get('data') or response.json().get('videos')  # Handle different API responses
+            else:
+                videos = live_by_account.get(account_url)
 
             if not videos:
                 #print(f"No videos found on {instance} from {account_name}.")
@@ -231,28 +218,33 @@ def get_live_streams_from_peertube():
                     #print("Skipping video with no URL.")
                     continue
 
-                # Check if this combination of account_url and published_at has already been posted
-                if (account_url, published_at) in posted_streams:
+                # Check if this combination of account_url and published_at has already been posted or queued
+                if (account_url, published_at) in posted_streams or outbox.is_queued(account_url, published_at):
                     #print(f"Already posted: {account_url}, {published_at}. Skipping...")
                     continue
 
-                # Check if the video is live by accessing the individual video endpoint
-                video_api_url = f"https://{instance}/api/v1/videos/{video_id}"  # Use https
-                try:
-                    video_response = requests.get(video_api_url, timeout=10)
-                    video_response.raise_for_status()
-                    video_data = video_response.json()
-                    is_live = video_data.get('isLive', False)  # Check the 'isLive' attribute
-                except requests.RequestException as e:
-                    #print(f"Error checking video status for {video_id}: {e}")
-                    continue  # Skip to the next video
+                # The listing already carries 'isLive', only ask the video endpoint when it's missing
+                if 'isLive' in video:
+                    is_live = bool(video['isLive'])
+                    requests_saved += 1
+                else:
+                    video_api_url = f"https://{instance}/api/v1/videos/{video_id}"  # Use https
+                    fallback_lookups += 1
+                    try:
+                        video_response = http_client.get(video_api_url, timeout=10)
+                        video_response.raise_for_status()
+                        video_data = video_response.json()
+                        is_live = video_data.get('isLive', False)  # Check the 'isLive' attribute
+                    except requests.RequestException as e:
+                        #print(f"Error checking video status for {video_id}: {e}")
+                        continue  # Skip to the next video
 
                 if is_live:  # Only post if the video is currently live
                     print(f"Found live stream: {video_title} ({video_url})")
 
                     # Generate description if not already generated
                     if video_url not in generated_descriptions:
-                        mastodon_description = generate_mastodon_hashtags(video_title)
+                        mastodon_description = hashtag_cache.get_hashtags(video_title, generate_mastodon_hashtags)
                         if mastodon_description:
                             generated_descriptions[video_url] = mastodon_description
                         else:
@@ -268,16 +260,10 @@ def get_live_streams_from_peertube():
                     print(base_url)
                     account = STREAM_TO_MASTODON_ACCOUNT.get(base_url, DEFAULT_ACCOUNT)
 
-                    # Generate and post to Mastodon
+                    # Generate and queue for Mastodon, the outbox saves account_url and publishedAt once posted
                     message = generate_post_template(video_url, description, account)
-                    try:
-                        mastodon.status_post(message, visibility="public")
-                        print(f"Toot sent: {message}")
-                        save_posted_stream(account_url, published_at)  # Save account_url and publishedAt
-                        time.sleep(random.uniform(2, 5))  # Avoid rate limiting
-                    except Exception as e:
-                        #print(f"Error posting to Mastodon: {e}")
-                        pass
+                    if outbox.enqueue(account_url, published_at, message):
+                        print(f"Toot queued: {message}")
                 else:
                     pass  #print(f"Video {video_title} ({video_url}) is not live, skipping.")
 
@@ -288,6 +274,9 @@ def get_live_streams_from_peertube():
             #print(f"An unexpected error occurred: {e}")
             pass
 
+    print(f"PeerTube live check: {instance_requests} instance queries and {account_listings} account listings "
+          f"for {len(USER_URLS)} accounts, {requests_saved} per-video requests saved, {fallback_lookups} fallback lookups")
+
 def get_live_streams_from_owncast():
     """Fetch live streams from multiple Owncast instances and post to Mastodon if not already posted."""
     posted_streams = load_posted_streams()
@@ -298,7 +287,7 @@ def get_live_streams_from_owncast():
         #print(f"Checking {instance} for live status...")
 
         try:
-            response = requests.get(api_url, timeout=10)
+            response = http_client.get(api_url, timeout=10)
             response.raise_for_status()
             data = response.json()
 
@@ -310,8 +299,8 @@ def get_live_streams_from_owncast():
             video_title = data.get("streamTitle", "Live Stream")
             last_connect_time = data.get("lastConnectTime", "")  # Capture lastConnectTime
 
-            # Check if this combination of video_url and last_connect_time has already been posted
-            if (video_url, last_connect_time) in posted_streams:
+            # Check if this combination of video_url and last_connect_time has already been posted or queued
+            if (video_url, last_connect_time) in posted_streams or outbox.is_queued(video_url, last_connect_time):
                 #print(f"Already posted: {video_url}, {last_connect_time}. Skipping...")
                 continue
 
@@ -321,7 +310,7 @@ def get_live_streams_from_owncast():
 
                 # Generate description if not already generated
                 if video_url not in generated_descriptions:
-                    mastodon_description = generate_mastodon_hashtags(video_title)
+                    mastodon_description = hashtag_cache.get_hashtags(video_title, generate_mastodon_hashtags)
                     if mastodon_description:
                         generated_descriptions[video_url] = mastodon_description
                     else:
@@ -333,16 +322,10 @@ def get_live_streams_from_owncast():
                 # Get the Mastodon account from the mapping, default to DEFAULT_ACCOUNT if not found
                 account = STREAM_TO_MASTODON_ACCOUNT.get(instance, DEFAULT_ACCOUNT)
 
-                # Generate and post to Mastodon
+                # Generate and queue for Mastodon, the outbox saves Owncast URL and lastConnectTime once posted
                 message = generate_owncast_post_template(video_url, description, account)  # Use Owncast template
-                try:
-                    mastodon.status_post(message, visibility="public")
-                    print(f"Toot sent: {message}")
-                    save_posted_stream(video_url, last_connect_time)  # Save Owncast URL and lastConnectTime
-                    time.sleep(random.uniform(2, 5))  # Avoid rate limiting
-                except Exception as e:
-                    #print(f"Error posting to Mastodon: {e}")
-                    pass
+                if outbox.enqueue(video_url, last_connect_time, message):
+                    print(f"Toot queued: {message}")
             else:
                 #print(f"Owncast instance {video_url} is not live, skipping.")
                 pass
@@ -356,5 +339,11 @@ def get_live_streams_from_owncast():
 
 if __name__ == "__main__":
     print("Starting new cycle...")
+    started_sender = outbox.start_sender(save_posted_stream)  # Background sender, started once per process
     get_live_streams_from_peertube()
     get_live_streams_from_owncast()
+    hashtag_cache.print_stats()
+    if started_sender:
+        # First run in this process, it may exit right after: give the sender time. Later cycles
+        # under main.py find the sender still running and return straight away.
+        outbox.wait_until_sent(OUTBOX_EXIT_TIMEOUT)
@@ -0,0 +1,44 @@
+import re
+import time
+import unicodedata
+import stream_store
+
+# Persistent cache of the LLM generated hashtags, keyed by normalized stream title.
+# Streamers mostly reuse their titles, so a repeat stream is announced without
+# another multi-second model call. Entries expire after HASHTAG_TTL and the least
+# recently used ones are evicted past HASHTAG_CACHE_SIZE. Rows and the hit/miss
+# counters live in the stream store.
+
+HASHTAG_TTL = 30 * 86400  # Seconds before a title's hashtags are generated again
+HASHTAG_CACHE_SIZE = 2000  # Max cached titles
+
+def normalize_title(title):
+    """Case, width and punctuation insensitive key, "Art Stream!!" and "art  stream" share hashtags."""
+    title = unicodedata.normalize("NFKC", title or "").casefold()
+    return " ".join(re.sub(r"[^\w#]+", " ", title).split())
+
+def lookup(title):
+    """Cached hashtags for title, None on a miss or for an empty title."""
+    key = normalize_title(title)
+    if not key:
+        return None
+    return stream_store.get_cached_hashtags(key, time.time(), HASHTAG_TTL)
+
+def store(title, hashtags):
+    key = normalize_title(title)
+    if key and hashtags:
+        stream_store.put_cached_hashtags(key, hashtags, time.time(), HASHTAG_TTL, HASHTAG_CACHE_SIZE)
+
+def get_hashtags(title, generate):
+    """Cached hashtags for title, else generate(title), cached when it returned something."""
+    hashtags = lookup(title)
+    if hashtags is None:
+        hashtags = generate(title)
+        store(title, hashtags)
+    return hashtags
+
+def print_stats():
+    entries, hits, misses = stream_store.hashtag_cache_stats()
+    total = hits + misses
+    rate = f"{hits / total:.0%}" if total else "n/a"
+    print(f"Hashtag cache: {entries} titles, {hits} hits, {misses} misses ({rate} hit rate)")
@@ -0,0 +1,66 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared HTTP client used by every scraper and bot.
+# The session lives as long as the process, so when main.py re-runs the scripts
+# each cycle the keep-alive connections to every host are reused instead of
+# paying a new TCP+TLS handshake per request.
+
+DEFAULT_TIMEOUT = 10  # Seconds, used when the caller doesn't pass a timeout
+POOL_CONNECTIONS = 64  # Number of hosts kept in the pool
+POOL_MAXSIZE = 8  # Keep-alive connections kept per host
+RETRY_CONNECT = 1  # Retries for connection errors
+RETRY_STATUS = 2  # Retries for the status codes below (GET only, POST is never retried)
+RETRY_BACKOFF = 0.5  # Backoff factor between retries
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+USER_AGENT = "mastodon-stream-bot (+https://github.com/solidheron/mastodon-stream-bot)"
+
+_sessions = {}  # retry -> Session
+_session_lock = threading.Lock()
+
+def build_session(retry=True):
+    """
+    Create a requests Session with pooled adapters and shared retry defaults. With
+    retry=False nothing is retried, for callers that hold a strict time budget per host.
+    """
+    retries = Retry(
+        total=RETRY_CONNECT + RETRY_STATUS,
+        connect=RETRY_CONNECT,
+        read=0,  # Read timeouts are left to the callers, some of them retry on their own
+        status=RETRY_STATUS,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,  # Hand the last response back so callers can check the status
+    ) if retry else 0
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retries)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+def get_session(retry=True):
+    """Return the process wide session, creating it on first use."""
+    session = _sessions.get(retry)
+    if session is None:
+        with _session_lock:
+            session = _sessions.get(retry)
+            if session is None:
+                session = _sessions[retry] = build_session(retry)
+    return session
+
+def close_session():
+    """Close every pooled connection, the next request opens a new session."""
+    with _session_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+def get(url, timeout=DEFAULT_TIMEOUT, retry=True, **kwargs):
+    return get_session(retry).get(url, timeout=timeout, **kwargs)
+
+def post(url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return get_session().post(url, timeout=timeout, **kwargs)
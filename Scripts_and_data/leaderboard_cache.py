@@ -0,0 +1,54 @@
+import os
+import pickle
+import time
+import stream_store
+import stream_rollups
+from leaderboard_stats import WINDOWS
+
+# Leaderboard results shared between leaderboard_post_to_mastodon.py and
+# leaderboard_lemmy_json_maker.py. Results are keyed on the store's sessions
+# revision and the windows, kept in memory for the scripts main.py runs
+# in-process and pickled to disk for separate runs. Windows roll with time,
+# so an entry is also dropped once it's older than CACHE_MAX_AGE.
+
+CACHE_FILE = "DATA/leaderboard_cache.pkl"
+CACHE_MAX_AGE = 1800  # Seconds a result is reused for while no session changes
+
+_cache = {}  # (revision, windows) -> (computed_at, stats)
+
+def cache_key(windows):
+    return (stream_store.get_sessions_revision(), tuple(windows))
+
+def load_disk_cache():
+    try:
+        with open(CACHE_FILE, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError, AttributeError):
+        return {}
+
+def save_disk_cache(entries):
+    tmp_file = CACHE_FILE + ".tmp"
+    try:
+        with open(tmp_file, "wb") as f:
+            pickle.dump(entries, f)
+        os.replace(tmp_file, CACHE_FILE)
+    except OSError as e:
+        print(f"Could not write {CACHE_FILE}: {e}")
+
+def get_leaderboards(windows=WINDOWS):
+    """Return compute_leaderboards_from_rollups(windows), reused while the sessions are unchanged."""
+    key = cache_key(windows)
+    now = time.time()
+    entry = _cache.get(key)
+    if not entry or now - entry[0] > CACHE_MAX_AGE:
+        entry = load_disk_cache().get(key)
+    if entry and now - entry[0] <= CACHE_MAX_AGE:
+        _cache[key] = entry
+        print(f"Reusing leaderboards computed {int(now - entry[0])}s ago.")
+        return entry[1]
+
+    stats = stream_rollups.compute_leaderboards_from_rollups(windows, now)
+    _cache.clear()  # Only the latest revision is ever asked for again
+    _cache[key] = (now, stats)
+    save_disk_cache(dict(_cache))
+    return stats
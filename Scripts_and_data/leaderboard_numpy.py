@@ -0,0 +1,185 @@
+import random
+import sys
+import time
+from datetime import datetime
+import leaderboard_stats
+from leaderboard_stats import EST, MIN_SHORT_STREAM, WINDOWS, StreamSession, finish_window_stats, new_window_stats
+from time_of_day import MINUTES_PER_DAY
+
+# Optional NumPy backend for leaderboard_stats.compute_leaderboards.
+# Sessions are loaded into columns (start, end, duration, views, account code)
+# and the per-account max/min/sum/count for every window are computed with
+# vectorized group-by operations. Results match the pure Python pass exactly,
+# including dict order, which the stable ranking sorts rely on for ties.
+# Run this file directly to benchmark both backends against each other.
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def available():
+    return np is not None
+
+def to_columns(sessions):
+    """Return (codes, start, end, duration, views, accounts) arrays, accounts in first-seen order."""
+    account_codes = {}
+    n = len(sessions)
+    nan = float("nan")
+    codes = np.fromiter((account_codes.setdefault(s.account, len(account_codes)) for s in sessions), np.int64, n)
+    start = np.fromiter((nan if s.start is None else s.start for s in sessions), np.float64, n)
+    end = np.fromiter((nan if s.end is None else s.end for s in sessions), np.float64, n)
+    duration = np.fromiter((s.duration for s in sessions), np.float64, n)
+    views = np.fromiter((s.views for s in sessions), np.int64, n)
+    return codes, start, end, duration, views, list(account_codes)
+
+def first_seen_order(codes):
+    """Return the distinct codes in order of first appearance."""
+    unique, first_index = np.unique(codes, return_index=True)
+    return unique[np.argsort(first_index, kind="stable")]
+
+def group_extreme(idx, codes, values, n_accounts, largest):
+    """For the rows in idx return {code: index of the first row holding the account's max (or min) value}."""
+    group_codes = codes[idx]
+    group_values = values[idx]
+    extreme = np.full(n_accounts, -np.inf if largest else np.inf)
+    (np.maximum if largest else np.minimum).at(extreme, group_codes, group_values)
+    hits = idx[group_values == extreme[group_codes]]
+    unique, first_index = np.unique(codes[hits], return_index=True)
+    return dict(zip(unique.tolist(), hits[first_index].tolist()))
+
+def utc_offset(timestamp, tz):
+    return datetime.fromtimestamp(timestamp, tz).utcoffset().total_seconds()
+
+def utc_offsets(timestamps, tz):
+    """
+    Return the UTC offset in seconds of tz at every timestamp. The offset is looked up
+    once at both ends of every UTC day present, only timestamps on the rare days where
+    the two differ (a DST change) are looked up one by one.
+    """
+    days = np.floor_divide(timestamps, 86400).astype(np.int64)
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    day_start = np.array([utc_offset(int(day) * 86400, tz) for day in unique_days.tolist()])
+    day_end = np.array([utc_offset((int(day) + 1) * 86400, tz) for day in unique_days.tolist()])
+    offsets = day_start[inverse]
+    for i in np.nonzero((day_start != day_end)[inverse])[0].tolist():
+        offsets[i] = utc_offset(float(timestamps[i]), tz)
+    return offsets
+
+def add_time_of_day_columns(stats, start, end, tz=EST):
+    """Vectorized add_time_of_day for all rows of a window at once."""
+    start_offsets = utc_offsets(start, tz)
+    end_offsets = utc_offsets(end, tz)
+    local_start = np.floor(start + start_offsets).astype(np.int64)
+    local_end = np.floor(end + end_offsets).astype(np.int64)
+    start_sec = local_start % 86400
+    end_sec = local_end % 86400
+    wraps = start_sec > end_sec
+    # Whole days as in time_of_day.local_span: local dates apart, less the part wrapping past midnight
+    days = np.maximum(local_end // 86400 - local_start // 86400 - wraps, 0)
+    full = days > 0
+    occupancy = stats['time_of_day']
+
+    # Same difference arrays as time_of_day.add_stream: [first, last] or [first, end of day] + [0, last],
+    # plus every slot once per whole day for minutes and once per multi-day stream for hours
+    everything = np.ones(len(start_sec), dtype=bool)
+    for key, first, last, size, rows, whole in (
+            ('minutes', start_sec // 60, end_sec // 60, MINUTES_PER_DAY, everything, int(days.sum())),
+            ('hours', start_sec // 3600, end_sec // 3600, 24, ~full, int(full.sum()))):
+        first, last, wrapped = first[rows], last[rows], wraps[rows]
+        diff = np.zeros(size + 1, dtype=np.int64)
+        np.add.at(diff, first, 1)
+        np.add.at(diff, np.where(wrapped, size, last + 1), -1)
+        diff[0] += int(wrapped.sum()) + whole
+        diff[size] -= whole
+        np.add.at(diff, last[wrapped] + 1, -1)
+        occupancy[key] = (np.asarray(occupancy[key]) + diff).tolist()
+
+def compute_leaderboards_numpy(sessions, windows=WINDOWS, now=None, columns=None):
+    """Vectorized equivalent of leaderboard_stats.compute_leaderboards_python, columns can be passed pre-built."""
+    now = now if now is not None else time.time()
+    codes, start, end, duration, views, accounts = columns if columns is not None else to_columns(sessions)
+    n_accounts = len(accounts)
+    result = {'windows': {}, 'recent': {}, 'accounts': accounts}
+
+    has_end = ~np.isnan(end)
+    latest = np.full(n_accounts, -np.inf)
+    np.maximum.at(latest, codes[has_end], end[has_end])
+    result['recent'] = {
+        accounts[code]: datetime.fromtimestamp(latest[code], leaderboard_stats.pytz.utc)
+        for code in first_seen_order(codes[has_end]).tolist()
+    }
+
+    for days in windows:
+        stats = new_window_stats()
+        result['windows'][days] = stats
+        idx = np.flatnonzero(has_end & (end >= now - days * 86400))
+        if not len(idx):
+            continue
+        order = first_seen_order(codes[idx]).tolist()
+
+        longest = group_extreme(idx, codes, duration, n_accounts, largest=True)
+        most_viewed = group_extreme(idx, codes, views, n_accounts, largest=True)
+        totals = np.bincount(codes[idx], weights=duration[idx], minlength=n_accounts)
+        counts = np.bincount(codes[idx], minlength=n_accounts)
+        for code in order:
+            account = accounts[code]
+            stats['longest'][account] = (float(end[longest[code]]), float(duration[longest[code]]))
+            stats['views'][account] = (float(end[most_viewed[code]]), int(views[most_viewed[code]]))
+            stats['total_time'][account] = float(totals[code])
+            stats['count'][account] = int(counts[code])
+
+        short_idx = idx[duration[idx] >= MIN_SHORT_STREAM]
+        if len(short_idx):
+            shortest = group_extreme(short_idx, codes, duration, n_accounts, largest=False)
+            for code in first_seen_order(codes[short_idx]).tolist():
+                stats['shortest'][accounts[code]] = float(duration[shortest[code]])
+
+        stats['total_seconds'] = float(np.cumsum(duration[idx])[-1])  # Sequential sum, same rounding as Python
+        stats['streams'] = int(len(idx))
+
+        timed_idx = idx[~np.isnan(start[idx])]
+        add_time_of_day_columns(stats, start[timed_idx], end[timed_idx])
+
+    for stats in result['windows'].values():
+        finish_window_stats(stats)
+    return result
+
+def make_benchmark_sessions(n, n_accounts=2000, years=5, seed=1):
+    """Build n synthetic sessions spread over the last few years."""
+    rng = random.Random(seed)
+    now = time.time()
+    accounts = [f"https://stream{i}.example/" for i in range(n_accounts)]
+    sessions = []
+    for _ in range(n):
+        end = now - rng.random() * years * 365 * 86400
+        sessions.append(StreamSession(rng.choice(accounts), end - rng.randint(60, 8 * 3600), end, rng.randint(0, 500)))
+    return sessions
+
+def benchmark(sizes=(10000, 100000, 500000), windows=(1, 7, 30, 365)):
+    """Time both backends on synthetic data and check that their results are identical."""
+    print(f"Windows: {windows} days")
+    for n in sizes:
+        sessions = make_benchmark_sessions(n)
+        now = time.time()
+
+        started = time.perf_counter()
+        expected = leaderboard_stats.compute_leaderboards_python(sessions, windows, now)
+        python_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        columns = to_columns(sessions)
+        load_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = compute_leaderboards_numpy(sessions, windows, now, columns)
+        numpy_time = time.perf_counter() - started
+
+        match = "match" if actual == expected else "MISMATCH"
+        print(f"{n} sessions: python {python_time:.3f}s, numpy {numpy_time:.3f}s + {load_time:.3f}s column load "
+              f"({python_time / numpy_time:.1f}x without load), results {match}")
+
+if __name__ == "__main__":
+    if not available():
+        sys.exit("numpy is not installed")
+    benchmark()
@@ -0,0 +1,169 @@
+import sys
+import time
+from datetime import datetime
+import pytz
+import time_of_day
+
+# Single-pass aggregation shared by leaderboard_post_to_mastodon.py and
+# leaderboard_lemmy_json_maker.py. Sessions are parsed once into StreamSession
+# records, then every metric for every requested window is computed in one walk
+# over them. The post functions only format the precomputed results.
+
+WINDOWS = (1, 7)  # Days
+MIN_SHORT_STREAM = 900  # Streams shorter than 15 minutes don't count as "shortest"
+EST = pytz.timezone('America/New_York')
+NUMPY_MIN_SESSIONS = 20000  # Use the NumPy backend (if installed) from this many sessions on
+
+class StreamSession:
+    """One PeerTube or Owncast stream with pre-parsed epoch-second times."""
+    __slots__ = ('account', 'start', 'end', 'duration', 'views')
+
+    def __init__(self, account, start, end, views=0):
+        self.account = sys.intern(account)  # Interned, so every session of an account shares one string
+        self.start = start  # Epoch seconds, None when missing
+        self.end = end  # Epoch seconds, None when missing
+        self.duration = end - start if start is not None and end is not None else 0.0
+        self.views = views
+
+    def __repr__(self):
+        return f"StreamSession({self.account!r}, {self.start}, {self.end}, views={self.views})"
+
+def parse_iso8601(timestamp):
+    if timestamp:
+        try:
+            return datetime.fromisoformat(timestamp.rstrip("Z")).replace(tzinfo=pytz.utc)
+        except ValueError:
+            pass
+    return None
+
+def parse_epoch(timestamp):
+    dt = parse_iso8601(timestamp)
+    return dt.timestamp() if dt else None
+
+def parse_views(value):
+    try:
+        return int(value or 0)
+    except ValueError:
+        return 0
+
+def load_sessions(peertube_data, owncast_data):
+    """Parse peertube_data2 and owncast_streamtime rows into StreamSession records."""
+    sessions = []
+    for row in peertube_data:
+        sessions.append(StreamSession(
+            row.get('account_url', ''),
+            parse_epoch(row.get('published_at', '')),
+            parse_epoch(row.get('retrieval_time', '')),
+            parse_views(row.get('views'))))
+    for row in owncast_data:
+        sessions.append(StreamSession(
+            row.get('owncast_url', ''),
+            parse_epoch(row.get('last_connect_time', '')),
+            parse_epoch(row.get('last_disconnect_time', ''))))
+    return sessions
+
+def session_order(session):
+    """
+    Sort key putting sessions in end time order (ties by account, then start), sessions
+    without an end last. The daily rollups reproduce compute_leaderboards over sessions
+    in this order, dict order and ties included.
+    """
+    return (session.end is None, session.end or 0, session.account, session.start is None, session.start or 0)
+
+def local_times(session, tz=EST):
+    """Start and end seconds of day and whole days of a session in tz, as add_time_of_day takes them."""
+    return time_of_day.local_span(session.start, session.end, tz)
+
+def new_window_stats():
+    return {
+        'longest': {},  # account -> (end, duration)
+        'views': {},  # account -> (end, views)
+        'shortest': {},  # account -> duration, streams of MIN_SHORT_STREAM or more
+        'total_time': {},  # account -> seconds
+        'count': {},  # account -> streams
+        'total_seconds': 0.0,
+        'streams': 0,
+        'time_of_day': time_of_day.new_occupancy(),  # Replaced by finish_window_stats()
+    }
+
+def finish_window_stats(stats):
+    """
+    Turn the window's time of day occupancy into 'hour_counts' (EST hour -> streams active
+    during it), 'coverage' (merged EST seconds of day with a stream live) and 'concurrent'
+    (streams live per EST minute of day).
+    """
+    stats.update(time_of_day.summarize(stats.pop('time_of_day')))
+    return stats
+
+def compute_leaderboards(sessions, windows=WINDOWS, now=None, backend="auto"):
+    """
+    Aggregate every leaderboard metric for every window (in days).
+
+    backend is "python", "numpy" or "auto" (NumPy from NUMPY_MIN_SESSIONS sessions on,
+    when it's installed). Both backends return the same result.
+    """
+    if backend == "numpy" or (backend == "auto" and len(sessions) >= NUMPY_MIN_SESSIONS):
+        import leaderboard_numpy
+        if leaderboard_numpy.available():
+            return leaderboard_numpy.compute_leaderboards_numpy(sessions, windows, now)
+    return compute_leaderboards_python(sessions, windows, now)
+
+def compute_leaderboards_python(sessions, windows=WINDOWS, now=None):
+    """
+    Aggregate every leaderboard metric for every window (in days) in one pass.
+
+    Returns {'windows': {days: stats}, 'recent': {account: latest end as datetime},
+    'accounts': [unique accounts]} where stats is new_window_stats() after finish_window_stats().
+    """
+    now = now if now is not None else time.time()
+    thresholds = [(days, now - days * 86400) for days in windows]
+    result = {'windows': {days: new_window_stats() for days in windows}, 'recent': {}, 'accounts': []}
+    recent = {}
+    seen_accounts = set()
+
+    for session in sessions:
+        account = session.account
+        if account not in seen_accounts:
+            seen_accounts.add(account)
+            result['accounts'].append(account)
+
+        end = session.end
+        if end is None:
+            continue
+        if account not in recent or recent[account] < end:
+            recent[account] = end
+
+        duration = session.duration
+        views = session.views
+        session_times = None
+
+        for days, threshold in thresholds:
+            if end < threshold:
+                continue
+            stats = result['windows'][days]
+
+            if account not in stats['longest'] or stats['longest'][account][1] < duration:
+                stats['longest'][account] = (end, duration)
+            if account not in stats['views'] or stats['views'][account][1] < views:
+                stats['views'][account] = (end, views)
+            if duration >= MIN_SHORT_STREAM and (account not in stats['shortest'] or stats['shortest'][account] > duration):
+                stats['shortest'][account] = duration
+            stats['total_time'][account] = stats['total_time'].get(account, 0) + duration
+            stats['count'][account] = stats['count'].get(account, 0) + 1
+            stats['total_seconds'] += duration
+            stats['streams'] += 1
+
+            # Time of day analyses need the start time too, converted once per session
+            if session_times is None and session.start is not None:
+                session_times = local_times(session)
+            if session_times:
+                add_time_of_day(stats, *session_times)
+
+    for stats in result['windows'].values():
+        finish_window_stats(stats)
+    result['recent'] = {account: datetime.fromtimestamp(end, pytz.utc) for account, end in recent.items()}
+    return result
+
+def add_time_of_day(stats, start_sec, end_sec, days=0):
+    """Add one stream, given its EST start and end seconds of day and whole days, to a window's occupancy."""
+    time_of_day.add_stream(stats['time_of_day'], start_sec, end_sec, days)
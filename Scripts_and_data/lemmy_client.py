@@ -0,0 +1,134 @@
+import base64
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import http_client
+import stream_store
+
+# Lemmy API calls used by lemmy_posting_infastructure/lemmy_post.py, with
+# caches: the login JWT is kept in the stream store and reused across runs until
+# it expires, and community names are resolved to ids at most once per
+# COMMUNITY_TTL. Posts are submitted by a bounded pool of workers, so draining a
+# backlog costs at most one login, one lookup per community and parallel submits.
+
+JWT_REFRESH_MARGIN = 300  # Log in again this many seconds before the token expires
+JWT_DEFAULT_TTL = 24 * 3600  # Lemmy tokens usually carry no exp claim, reuse them this long after iat
+COMMUNITY_TTL = 3600  # Seconds a community name -> id lookup is reused
+SUBMIT_WORKERS = 4  # Posts submitted at the same time
+
+_jwt_cache = {}  # (instance, username) -> (jwt, expires_at), backed by stream_store.lemmy_logins
+_community_cache = {}  # (instance, community_name) -> (community_id, expires_at)
+_lock = threading.Lock()
+
+def get_jwt_token(instance, username, password):
+    url = f"{instance}/api/v3/user/login"
+    payload = {
+        "username_or_email": username,
+        "password": password
+    }
+    response = http_client.post(url, json=payload)
+    if response.status_code == 200:
+        return response.json().get("jwt")
+    else:
+        raise Exception(f"Failed to authenticate: {response.json()}")
+
+def get_community_id(instance, community_name, jwt_token):
+    url = f"{instance}/api/v3/community"
+    headers = {"Authorization": f"Bearer {jwt_token}"}
+    params = {"name": community_name}
+    response = http_client.get(url, headers=headers, params=params)
+    if response.status_code == 200:
+        return response.json().get("community_view", {}).get("community", {}).get("id")
+    else:
+        raise Exception(f"Failed to fetch community ID: {response.json()}")
+
+def submit_post(instance, jwt_token, community_id, title, body=None, url=None):
+    url_endpoint = f"{instance}/api/v3/post"
+    headers = {"Authorization": f"Bearer {jwt_token}"}
+    payload = {
+        "name": title,
+        "community_id": community_id,
+        "body": body,
+        "url": url,
+        "nsfw": False
+    }
+    response = http_client.post(url_endpoint, headers=headers, json=payload)
+    if response.status_code == 200:
+        return response.json()
+    else:
+        raise Exception(f"Failed to submit post: {response.json()}")
+
+def jwt_expiry(jwt_token, now):
+    """Expiry of a JWT from its exp claim, iat + JWT_DEFAULT_TTL without one, now + JWT_DEFAULT_TTL if unreadable."""
+    try:
+        payload = jwt_token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError, AttributeError):
+        return now + JWT_DEFAULT_TTL
+    if "exp" in claims:
+        return float(claims["exp"])
+    return float(claims.get("iat", now)) + JWT_DEFAULT_TTL
+
+def get_cached_jwt(instance, username, password):
+    """Return a JWT for the account, logging in only when there's no unexpired one in memory or in the store."""
+    key = (instance, username)
+    with _lock:
+        cached = _jwt_cache.get(key) or stream_store.get_lemmy_login(instance, username)
+        now = time.time()
+        if cached and cached[1] - JWT_REFRESH_MARGIN > now:
+            _jwt_cache[key] = cached
+            return cached[0]
+        jwt_token = get_jwt_token(instance, username, password)
+        _jwt_cache[key] = (jwt_token, jwt_expiry(jwt_token, now))
+        stream_store.put_lemmy_login(instance, username, *_jwt_cache[key])
+        return jwt_token
+
+def invalidate_jwt(instance, username):
+    with _lock:
+        _jwt_cache.pop((instance, username), None)
+        stream_store.delete_lemmy_login(instance, username)
+
+def get_cached_community_id(instance, community_name, jwt_token):
+    """Resolve a community name to its id, at most once per COMMUNITY_TTL."""
+    key = (instance, community_name)
+    with _lock:
+        cached = _community_cache.get(key)
+        if cached and cached[1] > time.time():
+            return cached[0]
+        community_id = get_community_id(instance, community_name, jwt_token)
+        if community_id is not None:  # Not found (yet), look it up again next time
+            _community_cache[key] = (community_id, time.time() + COMMUNITY_TTL)
+        return community_id
+
+def submit_entry(instance, username, password, entry):
+    """Submit one post_details entry with the cached JWT and community id."""
+    jwt_token = get_cached_jwt(instance, username, password)
+    community_id = get_cached_community_id(instance, entry["community_name"], jwt_token)
+    return submit_post(instance, jwt_token, community_id, entry["title"],
+                       body=entry.get("body", None), url=entry.get("url", None))
+
+def submit_all(instance, username, password, keyed_entries, max_workers=SUBMIT_WORKERS):
+    """
+    Submit (key, entry) pairs in parallel. Yields (key, entry, response, error) in input
+    order, so the caller can record every outcome by its key from its own thread.
+    """
+    keyed_entries = list(keyed_entries)
+    if not keyed_entries:
+        return
+    # Log in and resolve the communities up front, not once per worker
+    jwt_token = get_cached_jwt(instance, username, password)
+    for community_name in {entry["community_name"] for key, entry in keyed_entries}:
+        get_cached_community_id(instance, community_name, jwt_token)
+
+    def submit(keyed_entry):
+        key, entry = keyed_entry
+        try:
+            return key, entry, submit_entry(instance, username, password, entry), None
+        except Exception as e:
+            if "not_logged_in" in str(e):
+                invalidate_jwt(instance, username)  # Token revoked, the next call logs in again
+            return key, entry, None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keyed_entries)))) as executor:
+        yield from executor.map(submit, keyed_entries)
@@ -0,0 +1,39 @@
+import threading
+from mastodon import Mastodon
+import http_client
+from streamer_mastodon_account import access_token, mastodon_instance
+
+# One long-lived Mastodon client per (instance, token) for the whole process.
+# Mastodon.py reads the X-RateLimit-* headers of every response and, with
+# ratelimit_method="pace", spaces the next request so the remaining budget lasts
+# until the reset, so bursts of posts go out as fast as the server allows
+# instead of after fixed sleeps. Requests go through the shared http_client
+# session, reusing its keep-alive connections.
+
+RATELIMIT_METHOD = "pace"  # "pace", "wait" (burst, then sleep until the reset) or "throw"
+RATELIMIT_PACEFACTOR = 1.1  # >1 stays a bit under the allowed rate
+REQUEST_TIMEOUT = 30  # Seconds
+
+_clients = {}
+_lock = threading.RLock()  # Posts go out one at a time, so the pacing sees every request in order
+
+def get_client(token=access_token, api_base_url=mastodon_instance):
+    """Return the process-wide client for an instance and token, created on first use."""
+    with _lock:
+        key = (api_base_url, token)
+        if key not in _clients:
+            _clients[key] = Mastodon(
+                access_token=token,
+                api_base_url=api_base_url,
+                ratelimit_method=RATELIMIT_METHOD,
+                ratelimit_pacefactor=RATELIMIT_PACEFACTOR,
+                request_timeout=REQUEST_TIMEOUT,
+                session=http_client.get_session(),
+                user_agent=http_client.USER_AGENT,
+            )
+        return _clients[key]
+
+def status_post(status, token=access_token, api_base_url=mastodon_instance, **kwargs):
+    """Post a status with the shared client, paced by the instance's rate limit."""
+    with _lock:
+        return get_client(token, api_base_url).status_post(status, **kwargs)
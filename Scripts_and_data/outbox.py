@@ -0,0 +1,124 @@
+import hashlib
+import os
+import random
+import threading
+import time
+import mastodon_client
+import posted_registry
+import stream_store
+
+# Durable outbox for go-live toots. The detectors in StreamTracker_update_bot.py
+# only enqueue the rendered message (one SQLite insert) and keep polling, while a
+# background sender thread posts the queue with retries. (url, published_at) is
+# both the queue key and, hashed, the Idempotency-Key sent to Mastodon, so a
+# retry after a post that went through but timed out isn't posted twice.
+# Mastodon only remembers an Idempotency-Key for about an hour, so a message is
+# given up once it's older than MAX_MESSAGE_AGE, and the retry delays are sized
+# to use up fewer attempts than that.
+# Messages survive restarts: whatever is pending is sent by the next sender.
+
+MAX_ATTEMPTS = 8  # Attempts before a message is marked failed
+RETRY_DELAY = 30  # Seconds before the first retry, doubled per attempt with jitter
+MAX_RETRY_DELAY = 600  # Cap on the retry delay in seconds, all retries take under 45 minutes
+MAX_MESSAGE_AGE = 3000  # Seconds after enqueueing a message is given up, inside the Idempotency-Key lifetime
+IDLE_POLL_INTERVAL = 60  # Seconds the sender sleeps when nothing is due
+BATCH_SIZE = 20  # Messages loaded per pass
+KEEP_DAYS = 7  # Sent and failed messages are kept this long for inspection
+
+_wake = threading.Event()
+_sender = None
+_on_sent = None
+_lock = threading.Lock()
+
+def idempotency_key(url, published_at):
+    return hashlib.sha256(f"{url}|{published_at}".encode("utf-8")).hexdigest()
+
+def enqueue(url, published_at, message, visibility="public"):
+    """Queue a toot for (url, published_at), returns False when it was already queued."""
+    queued = stream_store.enqueue_outbox(url, published_at, message, visibility, time.time())
+    if queued:
+        _wake.set()
+    return queued
+
+def is_queued(url, published_at):
+    return stream_store.is_in_outbox(url, published_at)
+
+def retry_delay(attempts):
+    delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+def send(entry):
+    """Post one queued message and record the outcome."""
+    url, published_at = entry["url"], entry["published_at"]
+    attempts = entry["attempts"] + 1
+    if time.time() - entry["created"] > MAX_MESSAGE_AGE:
+        # Sent late, a retry could post twice and the stream may well be over anyway
+        stream_store.update_outbox(url, published_at, "failed", entry["attempts"], last_error="expired")
+        print(f"Giving up on toot for {url}, queued {time.time() - entry['created']:.0f}s ago")
+        return False
+    try:
+        mastodon_client.status_post(entry["message"], visibility=entry["visibility"],
+                                    idempotency_key=idempotency_key(url, published_at))
+    except Exception as e:
+        delay = retry_delay(attempts)
+        if attempts >= MAX_ATTEMPTS or time.time() + delay - entry["created"] > MAX_MESSAGE_AGE:
+            stream_store.update_outbox(url, published_at, "failed", attempts, last_error=str(e))
+            print(f"Giving up on toot for {url} after {attempts} attempts: {e}")
+        else:
+            stream_store.update_outbox(url, published_at, "pending", attempts, time.time() + delay, str(e))
+            print(f"Toot for {url} failed ({e}), retry {attempts}/{MAX_ATTEMPTS - 1} in {delay:.0f}s")
+        return False
+    stream_store.update_outbox(url, published_at, "sent", attempts)
+    print(f"Toot sent: {entry['message']}")
+    if _on_sent:
+        _on_sent(url, published_at)
+    else:
+        posted_registry.mark_posted(url, published_at)
+    return True
+
+def drain():
+    """Send every message that is due, returns the number sent."""
+    sent = 0
+    while True:
+        entries = stream_store.load_due_outbox(time.time(), BATCH_SIZE)
+        if not entries:
+            return sent
+        for entry in entries:
+            sent += send(entry)
+
+def sender_loop(db_path):
+    stream_store.bind_thread(db_path)
+    stream_store.delete_outbox_before(time.time() - KEEP_DAYS * 86400)
+    while True:
+        _wake.clear()
+        try:
+            drain()
+            next_attempt = stream_store.next_outbox_attempt()
+        except Exception as e:
+            print(f"Outbox sender error: {e}")
+            next_attempt = None
+        timeout = IDLE_POLL_INTERVAL if next_attempt is None else min(IDLE_POLL_INTERVAL, max(0, next_attempt - time.time()))
+        _wake.wait(timeout)
+
+def start_sender(on_sent=None):
+    """
+    Start the background sender once per process. on_sent(url, published_at) is called after
+    each successful post (default: posted_registry.mark_posted). Returns True when the sender
+    was started by this call, False when an earlier one is still running.
+    """
+    global _sender, _on_sent
+    with _lock:
+        _on_sent = on_sent
+        started = _sender is None or not _sender.is_alive()
+        if started:
+            db_path = os.path.abspath(stream_store.DB_FILE)  # Resolved now, main.py changes the working directory back
+            _sender = threading.Thread(target=sender_loop, args=(db_path,), name="outbox-sender", daemon=True)
+            _sender.start()
+    _wake.set()
+    return started
+
+def wait_until_sent(timeout):
+    """Wait up to timeout seconds for the messages due now to go out, for one-shot runs before exiting."""
+    deadline = time.time() + timeout
+    while time.time() < deadline and stream_store.load_due_outbox(time.time(), 1):
+        time.sleep(0.5)
@@ -1,9 +1,14 @@
 import requests
 import csv
+import http_client
+import stream_store
+import stream_rollups
+import owncast_sessionizer
+import viewer_series
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from dateutil import parser
 from datetime import timezone
 
 # List of Owncast instances
@@ -37,78 +42,66 @@ OWNCAST_INSTANCES = [
 OWNCAST_CSV_FILE = "DATA/owncast_data.csv"
 STREAMTIME_CSV_FILE = "DATA/owncast_streamtime.csv"
 POLL_INTERVAL = 3600  # Fetch data every 1 hour
+OWNCAST_MAX_WORKERS = 8  # Max number of instances polled at the same time
+OWNCAST_TIMEOUT = 15  # Per-host timeout in seconds, connect errors aren't retried so a dead host costs this once
 
-# Dictionary to track stream states {url: last recorded disconnect time}
-stream_states = {}
-
-def convert_to_utc_format(dt_string):
-    dt = parser.parse(dt_string)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    dt_utc = dt.astimezone(timezone.utc)
-    return dt_utc.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-def fetch_owncast_data(url):
+def fetch_owncast_data(url, timeout=OWNCAST_TIMEOUT):
     try:
         url = url.rstrip("/") + "/"
-        response = requests.get(f"{url}api/status", timeout=15)
+        # No retries: a retried connect to a dead host would hold a worker for twice the timeout plus backoff
+        response = http_client.get(f"{url}api/status", timeout=timeout, retry=False)
         response.raise_for_status()
         return response.json() if response.headers.get("Content-Type") == "application/json" else None
     except requests.RequestException:
         return None
 
+def fetch_all_owncast_data(urls, max_workers=OWNCAST_MAX_WORKERS, timeout=OWNCAST_TIMEOUT):
+    """Poll every instance's /api/status in parallel and return (url, data) pairs in input order."""
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+        results = executor.map(lambda url: fetch_owncast_data(url, timeout), urls)
+        return list(zip(urls, results))
+
 def write_owncast_to_csv(data, url):
     fieldnames = ["timestamp", "owncast_url", "last_connect_time", "last_disconnect_time", "viewer_count"]
-    file_exists = os.path.exists(OWNCAST_CSV_FILE)
+    now = time.time()
+    timestamp = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    if data:
+        row = {
+            "timestamp": timestamp,
+            "owncast_url": url,
+            "last_connect_time": data.get("lastConnectTime", ""),
+            "last_disconnect_time": data.get("lastDisconnectTime", ""),
+            "viewer_count": data.get("viewerCount", 0)
+        }
+    else:
+        row = {
+            "timestamp": timestamp,
+            "owncast_url": url,
+            "last_connect_time": "",
+            "last_disconnect_time": timestamp,
+            "viewer_count": ""
+        }
+    # Store first, else the store's one-time CSV import would pick up this row and it'd be inserted twice
+    stream_store.add_owncast_sample(**row)
 
+    file_exists = os.path.exists(OWNCAST_CSV_FILE)
     with open(OWNCAST_CSV_FILE, "a", newline="") as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         if not file_exists:
             writer.writeheader()
-
-        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        if data:
-            writer.writerow({
-                "timestamp": timestamp,
-                "owncast_url": url,
-                "last_connect_time": data.get("lastConnectTime", ""),
-                "last_disconnect_time": data.get("lastDisconnectTime", ""),
-                "viewer_count": data.get("viewerCount", 0)
-            })
-        else:
-            writer.writerow({
-                "timestamp": timestamp,
-                "owncast_url": url,
-                "last_connect_time": "",
-                "last_disconnect_time": timestamp,
-                "viewer_count": ""
-            })
-
-def get_last_valid_connect_time_and_viewer_count(url):
-    with open(OWNCAST_CSV_FILE, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
-        last_valid_connect_time = None
-        viewer_count = None
-        for row in reversed(list(reader)):
-            if row['owncast_url'] == url and row['last_connect_time']:
-                last_valid_connect_time = row['last_connect_time']
-                viewer_count = row['viewer_count']
-                break
-    return last_valid_connect_time, viewer_count
+        writer.writerow(row)
+    if data:
+        viewer_series.append(url, now, data.get("viewerCount") or 0)
 
 def write_streamtime_to_csv(url, disconnect_time, connect_time, viewer_count):
     fieldnames = ["owncast_url", "last_connect_time", "last_disconnect_time", "viewer_count"]
     file_exists = os.path.exists(STREAMTIME_CSV_FILE)
 
-    existing_entries = set()
-    if file_exists:
-        with open(STREAMTIME_CSV_FILE, "r", newline="") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                existing_entries.add((row["owncast_url"], row["last_disconnect_time"], row["last_connect_time"], row["viewer_count"]))
-
-    if (url, disconnect_time, connect_time, viewer_count) not in existing_entries:
+    # The store's unique (url, connect, disconnect) index is the dedup check, the CSV is never re-read
+    if stream_store.add_owncast_session(url, connect_time, disconnect_time, viewer_count):
         with open(STREAMTIME_CSV_FILE, "a", newline="") as f:
             writer = csv.DictWriter(f, fieldnames=fieldnames)
             if not file_exists:
@@ -119,33 +112,11 @@ def write_streamtime_to_csv(url, disconnect_time, connect_time, viewer_count):
                 "last_disconnect_time": disconnect_time,
                 "viewer_count": viewer_count
             })
-
-def track_stream_sessions(url, last_disconnect_time, last_connect_time):
-    global stream_states
-
-    if url not in stream_states:
-        stream_states[url] = None
-
-    prev_disconnect = stream_states[url]
-
-    if last_disconnect_time and last_disconnect_time != prev_disconnect:
-        valid_connect_time, viewer_count = get_last_valid_connect_time_and_viewer_count(url)
-        valid_connect_time = valid_connect_time or last_connect_time
-        if valid_connect_time:
-            try:
-                connect_time_utc = convert_to_utc_format(valid_connect_time)
-                disconnect_time_utc = convert_to_utc_format(last_disconnect_time)
-                connect_obj = datetime.strptime(connect_time_utc, "%Y-%m-%dT%H:%M:%SZ")
-                disconnect_obj = datetime.strptime(disconnect_time_utc, "%Y-%m-%dT%H:%M:%SZ")
-                if connect_obj < disconnect_obj:
-                    stream_states[url] = disconnect_time_utc
-                    write_streamtime_to_csv(url, disconnect_time_utc, connect_time_utc, viewer_count)
-            except Exception as e:
-                print(f"Error processing times for {url}: {e}")
+        stream_store.record_csv_signature(STREAMTIME_CSV_FILE)
+        stream_rollups.update_buckets([(url, disconnect_time)])
 
 if __name__ == "__main__":
-    for url in OWNCAST_INSTANCES:
-        data = fetch_owncast_data(url)
+    for url, data in fetch_all_owncast_data(OWNCAST_INSTANCES):
         write_owncast_to_csv(data, url)
-        if data:
-            track_stream_sessions(url, data.get("lastDisconnectTime"), data.get("lastConnectTime"))
+    # Sessions come from the recorded samples, the sessionizer's state lives in the store
+    owncast_sessionizer.sessionize(write_streamtime_to_csv)
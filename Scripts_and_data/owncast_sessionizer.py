@@ -0,0 +1,159 @@
+from datetime import datetime, timezone
+from dateutil import parser
+import stream_store
+import viewer_series
+
+# Turns the raw Owncast samples (owncast_data.csv, mirrored in the store) into
+# sessions. The viewer stats of a session come from viewer_series, or from the
+# viewer counts of its samples for history older than the series. A sample is
+# live when it reports a lastConnectTime newer than its lastDisconnectTime. A stream that starts and ends between two polls is never
+# seen live, it shows up as an offline sample with a new connect/disconnect pair
+# and is recorded from that pair alone. The open session and the last seen
+# disconnect of every instance and the id of the last processed sample are kept
+# in the store, so each run only reads the samples recorded since the previous
+# one and survives restarts of main.py.
+
+BATCH_SIZE = 5000  # Samples read and checkpointed at a time
+
+def to_utc(dt_string):
+    """Normalize an Owncast timestamp to '%Y-%m-%dT%H:%M:%SZ', None when missing or invalid."""
+    if not dt_string:
+        return None
+    if len(dt_string) == 20 and dt_string[-1] == "Z" and dt_string[10] == "T":
+        return dt_string  # Already normalized, as every timestamp this repo writes
+    try:
+        dt = datetime.fromisoformat(dt_string)
+    except ValueError:
+        try:
+            dt = parser.parse(dt_string)  # Slower, but copes with nanoseconds and other variants
+        except (ValueError, OverflowError):
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def to_epoch(utc_string):
+    return int(datetime.strptime(utc_string, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp())
+
+def from_epoch(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def parse_viewers(value):
+    try:
+        return int(value or 0)
+    except ValueError:
+        return 0
+
+def add_series_stats(session, window_end):
+    """Replace the viewer stats of a closed session by the viewer series' before window_end (epoch), if it has any."""
+    stats = viewer_series.window_stats(session["owncast_url"], to_epoch(session["last_connect_time"]), window_end)
+    if stats:
+        session["peak_viewers"] = stats["peak"]
+        session["mean_viewers"] = stats["mean"]
+        session["sample_count"] = stats["samples"]
+    return stats
+
+def close_session(session, disconnect_time, closed_at=None):
+    """
+    Finish an open session, ending it at the reported disconnect or else at its last viewer
+    sample before closed_at (the time of the sample that closed it).
+    """
+    reported = disconnect_time and disconnect_time > session["last_connect_time"]
+    end = disconnect_time if reported else session["last_seen"]
+    closed = {
+        "owncast_url": session["owncast_url"],
+        "last_connect_time": session["last_connect_time"],
+        "last_disconnect_time": end,
+        "peak_viewers": session["peak_viewers"],
+        "mean_viewers": session["viewer_sum"] / session["sample_count"],
+        "sample_count": session["sample_count"],
+    }
+    # The sample that closed the session was polled after it ended, its viewer count isn't the session's
+    window_end = to_epoch(end) + 1 if reported else max(to_epoch(end) + 1, to_epoch(closed_at) if closed_at else 0)
+    stats = add_series_stats(closed, window_end)
+    if stats and not reported:
+        closed["last_disconnect_time"] = max(end, from_epoch(stats["last"]))
+    return closed
+
+def missed_session(url, connect_time, disconnect_time):
+    """A stream that started and ended between two samples, its viewers are only known from the series."""
+    session = {
+        "owncast_url": url,
+        "last_connect_time": connect_time,
+        "last_disconnect_time": disconnect_time,
+        "peak_viewers": 0,
+        "mean_viewers": 0,
+        "sample_count": 0,
+    }
+    add_series_stats(session, to_epoch(disconnect_time) + 1)
+    return session
+
+def process_sample(open_sessions, last_disconnects, sample):
+    """Advance an instance's state with one sample, returns the list of sessions it closed."""
+    if not sample["last_connect_time"] and not sample["viewer_count"]:
+        return []  # The instance couldn't be reached, that says nothing about the stream
+    url = sample["owncast_url"]
+    connect_time = to_utc(sample["last_connect_time"])
+    disconnect_time = to_utc(sample["last_disconnect_time"])
+    live = connect_time is not None and (disconnect_time is None or connect_time > disconnect_time)
+
+    closed = []
+    session = open_sessions.get(url)
+    if session and (not live or connect_time != session["last_connect_time"]):
+        # Offline with another connect time: a second stream came and went, the disconnect is its own
+        same_stream = live or connect_time == session["last_connect_time"]
+        closed.append(close_session(session, disconnect_time if same_stream else None, to_utc(sample["timestamp"])))
+        del open_sessions[url]
+        session = None
+
+    # The first sample of an instance only sets the baseline, its pair may predate the recording
+    previous_disconnect = last_disconnects.get(url)
+    if disconnect_time:
+        last_disconnects[url] = disconnect_time
+    if (not live and connect_time and disconnect_time and connect_time < disconnect_time
+            and previous_disconnect is not None and disconnect_time != previous_disconnect
+            and not any(s["last_connect_time"] == connect_time for s in closed)):
+        closed.append(missed_session(url, connect_time, disconnect_time))
+
+    if live:
+        if session is None:
+            session = open_sessions[url] = {
+                "owncast_url": url,
+                "last_connect_time": connect_time,
+                "last_seen": connect_time,
+                "peak_viewers": 0,
+                "viewer_sum": 0,
+                "sample_count": 0,
+            }
+        viewers = parse_viewers(sample["viewer_count"])
+        session["last_seen"] = to_utc(sample["timestamp"]) or session["last_seen"]
+        session["peak_viewers"] = max(session["peak_viewers"], viewers)
+        session["viewer_sum"] += viewers
+        session["sample_count"] += 1
+    return closed
+
+def sessionize(emit, batch_size=BATCH_SIZE):
+    """
+    Process the samples recorded since the last checkpoint. Every closed session is passed to
+    emit(url, disconnect_time, connect_time, peak_viewers), e.g. write_streamtime_to_csv.
+    Returns the number of sessions closed.
+    """
+    checkpoint, open_sessions, last_disconnects = stream_store.load_sessionizer_state()
+    closed_count = 0
+    while True:
+        samples = stream_store.load_owncast_samples_after(checkpoint, batch_size)
+        if not samples:
+            break
+        closed_sessions = []
+        for sample in samples:
+            for closed in process_sample(open_sessions, last_disconnects, sample):
+                if closed["last_connect_time"] < closed["last_disconnect_time"]:
+                    closed_sessions.append(closed)
+        # Emitting is idempotent (the store dedups sessions), so a crash before the checkpoint only re-emits
+        for session in closed_sessions:
+            emit(session["owncast_url"], session["last_disconnect_time"], session["last_connect_time"], session["peak_viewers"])
+        checkpoint = samples[-1]["id"]
+        stream_store.save_sessionizer_state(checkpoint, open_sessions, last_disconnects)
+        closed_count += len(closed_sessions)
+    print(f"Sessionized Owncast samples up to #{checkpoint}: {closed_count} sessions closed, {len(open_sessions)} live.")
+    return closed_count
@@ -0,0 +1,87 @@
+import requests
+import http_client
+from urllib.parse import urlparse
+
+# Instance-grouped live detection for PeerTube.
+# Instead of listing every tracked account's videos, ask each instance once for
+# its local live videos and match them back to the tracked accounts locally, so
+# the number of requests grows with the number of instances, not accounts.
+
+LIVE_PAGE_SIZE = 100  # Max page size accepted by /api/v1/videos
+LIVE_MAX_PAGES = 5  # Safety cap on pagination per instance
+
+def extract_instance_and_account(account_url):
+    """Split 'https://host/a/name/video-channels' into ('https://host', 'name')."""
+    parsed_url = urlparse(account_url)
+    instance_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    account_name = parsed_url.path.split('/')[2]
+    return instance_url, account_name
+
+def group_accounts_by_instance(account_urls):
+    """
+    Return ({instance_url: {account_name: account_url}}, unparsed_account_urls) keeping
+    the input order. URLs that don't look like an account URL are returned as unparsed.
+    """
+    plan = {}
+    unparsed = []
+    for account_url in account_urls:
+        try:
+            instance_url, account_name = extract_instance_and_account(account_url)
+        except IndexError:
+            unparsed.append(account_url)
+            continue
+        plan.setdefault(instance_url, {})[account_name] = account_url
+    return plan, unparsed
+
+def fetch_instance_live_videos(instance_url, timeout=10):
+    """Return the local live videos of an instance, or None if the instance couldn't be queried."""
+    url = f"{instance_url}/api/v1/videos"
+    params = {"isLive": "true", "isLocal": "true", "count": LIVE_PAGE_SIZE, "start": 0, "sort": "-publishedAt"}
+    videos = []
+    requests_made = 0
+    try:
+        for _ in range(LIVE_MAX_PAGES):
+            response = http_client.get(url, params=params, timeout=timeout)
+            requests_made += 1
+            response.raise_for_status()
+            data = response.json()
+            page = data.get("data", [])
+            videos.extend(page)
+            params["start"] += len(page)
+            if not page or params["start"] >= data.get("total", 0):
+                break
+    except (requests.RequestException, ValueError) as e:
+        print(f"Live query failed for {instance_url}: {e}")
+        return None, requests_made
+    return videos, requests_made
+
+def find_live_videos(account_urls):
+    """
+    Query every instance once and match its live videos to the tracked accounts.
+
+    Returns ({account_url: [video, ...]}, failed_account_urls, requests_made).
+    Accounts whose instance couldn't be queried, or whose URL couldn't be split into
+    instance and account, are returned in failed_account_urls so the caller can fall
+    back to the per-account listing.
+    """
+    live_by_account = {}
+    plan, failed_accounts = group_accounts_by_instance(account_urls)
+    total_requests = 0
+
+    for instance_url, accounts in plan.items():
+        videos, requests_made = fetch_instance_live_videos(instance_url)
+        total_requests += requests_made
+        if videos is None:
+            failed_accounts.extend(accounts.values())
+            continue
+
+        instance_host = urlparse(instance_url).netloc
+        for video in videos:
+            account = video.get("account") or {}
+            if account.get("host", instance_host) != instance_host:
+                continue
+            account_url = accounts.get(account.get("name"))
+            if account_url and video.get("isLive", True):
+                live_by_account.setdefault(account_url, []).append(video)
+
+    return live_by_account, failed_accounts, total_requests
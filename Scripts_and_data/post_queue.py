@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Append-only queue of the Lemmy posts. Every change is one JSON line: a "queued"
+# record carrying the entry, then "posted" or "failed" records naming it by hash.
+# The whole log is replayed into an in-memory index once per process, after that
+# enqueue and mark_posted are a single fsync'd append. A half-written last line
+# (crash mid-write) is skipped on load. Once superseded records outnumber the live
+# ones the log is rewritten to a temp file and swapped in with os.replace.
+
+LEMMY_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lemmy_posting_infastructure")
+QUEUE_FILE = os.path.join(LEMMY_FOLDER, "post_queue.jsonl")
+LEGACY_QUEUED_FILE = os.path.join(LEMMY_FOLDER, "post_details.json")
+LEGACY_POSTED_FILE = os.path.join(LEMMY_FOLDER, "posted_entries.json")
+MAX_ATTEMPTS = 5  # An entry that failed this many times is no longer handed out
+COMPACT_MIN_RECORDS = 200  # Don't bother compacting a log shorter than this
+POSTED_KEEP_DAYS = 90  # Posted or given-up entries are kept this long for dedup, then dropped on compaction
+
+_lock = threading.RLock()
+_index = {}  # hash -> {"entry", "status", "attempts", "time", "error"}
+_records = 0  # Lines in the log, live or superseded
+_offset = None  # Bytes of the log already replayed, None until loaded
+
+def entry_hash(entry):
+    return hashlib.sha256(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest()
+
+def apply_record(record):
+    op = record.get("op")
+    key = record.get("hash")
+    if op == "queued":
+        if key not in _index:
+            _index[key] = {"entry": record["entry"], "status": "queued", "attempts": 0,
+                           "time": record.get("time", 0), "error": None}
+    elif key in _index:
+        item = _index[key]
+        if op == "posted":
+            item["status"] = "posted"
+        elif op == "failed":
+            item["status"] = "failed"
+            item["attempts"] = record.get("attempts", item["attempts"] + 1)
+            item["error"] = record.get("error")
+        item["time"] = record.get("time", item["time"])
+
+def replay(f):
+    """Apply the complete lines from the current position, return the bytes consumed."""
+    global _records
+    consumed = 0
+    for line in f:
+        if not line.endswith(b"\n"):
+            break  # Torn write from a crash, leave it out of the offset
+        consumed += len(line)
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        _records += 1
+        apply_record(record)
+    return consumed
+
+def refresh():
+    """Load the log once, then only read what other processes appended since."""
+    global _offset, _records
+    with _lock:
+        if _offset is None:
+            migrate_legacy_files()
+        size = os.path.getsize(QUEUE_FILE) if os.path.exists(QUEUE_FILE) else 0
+        if _offset is not None and size == _offset:
+            return
+        if _offset is None or size < _offset:  # First load, or compacted elsewhere
+            _index.clear()
+            _records = 0
+            _offset = 0
+        if size == 0:
+            return
+        with open(QUEUE_FILE, "rb") as f:
+            f.seek(_offset)
+            _offset += replay(f)
+
+def append_records(records):
+    global _offset, _records
+    data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+    with open(QUEUE_FILE, "ab") as f:
+        if f.tell() != _offset:  # Torn tail from a crash, start our records on a fresh line
+            data = b"\n" + data
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+        _offset = f.tell()
+    for record in records:
+        _records += 1
+        apply_record(record)
+
+def migrate_legacy_files():
+    """One-time import of post_details.json / posted_entries.json into the log."""
+    if os.path.exists(QUEUE_FILE):
+        return
+    records = []
+    now = time.time()
+    for path, status in ((LEGACY_POSTED_FILE, "posted"), (LEGACY_QUEUED_FILE, "queued")):
+        try:
+            with open(path, "r") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        for entry in entries if isinstance(entries, list) else []:
+            key = entry_hash(entry)
+            records.append({"op": "queued", "hash": key, "entry": entry, "time": now})
+            if status == "posted":
+                records.append({"op": "posted", "hash": key, "time": now})
+    if not records:
+        return
+    os.makedirs(LEMMY_FOLDER, exist_ok=True)
+    write_log(records)
+    for path in (LEGACY_QUEUED_FILE, LEGACY_POSTED_FILE):
+        if os.path.exists(path):
+            os.replace(path, path + ".migrated")
+    print(f"Migrated {len(records)} post records to {QUEUE_FILE}")
+
+def write_log(records):
+    tmp_path = QUEUE_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, QUEUE_FILE)
+
+def enqueue(entry):
+    """Queue an entry, returns False if the same entry is already queued or was posted."""
+    with _lock:
+        refresh()
+        key = entry_hash(entry)
+        if key in _index:
+            return False
+        append_records([{"op": "queued", "hash": key, "entry": entry, "time": time.time()}])
+        return True
+
+def mark_posted(key):
+    with _lock:
+        refresh()
+        append_records([{"op": "posted", "hash": key, "time": time.time()}])
+        maybe_compact()
+
+def mark_failed(key, error=None):
+    with _lock:
+        refresh()
+        attempts = _index[key]["attempts"] + 1 if key in _index else 1
+        append_records([{"op": "failed", "hash": key, "time": time.time(), "attempts": attempts,
+                         "error": str(error) if error else None}])
+        maybe_compact()
+
+def pending():
+    """(hash, entry) of every entry still to post, oldest first."""
+    with _lock:
+        refresh()
+        return [(key, item["entry"]) for key, item in _index.items()
+                if item["status"] != "posted" and item["attempts"] < MAX_ATTEMPTS]
+
+def maybe_compact():
+    if _records >= COMPACT_MIN_RECORDS and _records > 2 * len(_index):
+        compact()
+
+def compact():
+    """Rewrite the log with one queued (plus at most one status) record per entry."""
+    global _offset
+    with _lock:
+        refresh()
+        cutoff = time.time() - POSTED_KEEP_DAYS * 86400
+        records = []
+        for key, item in list(_index.items()):
+            done = item["status"] == "posted" or item["attempts"] >= MAX_ATTEMPTS
+            if done and item["time"] < cutoff:
+                del _index[key]
+                continue
+            records.append({"op": "queued", "hash": key, "entry": item["entry"], "time": item["time"]})
+            if item["status"] != "queued":
+                records.append({"op": item["status"], "hash": key, "time": item["time"],
+                                "attempts": item["attempts"], "error": item["error"]})
+        write_log(records)
+        _index.clear()
+        _offset = None
+        refresh()
@@ -0,0 +1,56 @@
+import threading
+import time
+import stream_store
+
+# In-memory registry of posted go-live notifications.
+# Loaded from the stream store once per process (main.py re-runs the bot in the
+# same process, so later cycles reuse it) and updated in place on every post.
+# Entries posted more than RETENTION_DAYS ago are dropped from memory and from the
+# store so the set stays bounded no matter how long the bot has been running.
+# Retention goes by when the notification was posted, not by the stream timestamp,
+# so a stream that stays live for longer than the window is never posted twice.
+
+RETENTION_DAYS = 60  # Keep notifications posted less than this many days ago
+COMPACT_INTERVAL = 24 * 3600  # Seconds between compactions
+
+_posted = None  # (url, timestamp) -> posted_at epoch seconds
+_last_compaction = 0
+_lock = threading.RLock()  # The outbox sender thread marks posts while the bot reads and compacts
+
+def get_retention_cutoff():
+    return time.time() - RETENTION_DAYS * 86400
+
+def compact():
+    """Age out notifications posted before the retention window, in memory and in the store."""
+    global _last_compaction
+    cutoff = get_retention_cutoff()
+    with _lock:
+        removed = stream_store.delete_posted_streams_before(cutoff)
+        if _posted is not None:
+            for key in [key for key, posted_at in _posted.items() if posted_at < cutoff]:
+                del _posted[key]
+        _last_compaction = time.time()
+    if removed:
+        print(f"Compacted posted streams: {removed} entries posted more than {RETENTION_DAYS} days ago removed")
+
+def get_posted_streams():
+    """Return the live {(url, timestamp): posted_at} registry, loading it on first use."""
+    global _posted
+    with _lock:
+        if _posted is None:
+            _posted = stream_store.load_posted_streams()
+        if time.time() - _last_compaction > COMPACT_INTERVAL:
+            compact()
+        return _posted
+
+def is_posted(url, timestamp):
+    return (url, timestamp) in get_posted_streams()
+
+def mark_posted(url, timestamp):
+    """Record a notification in memory and in the store."""
+    with _lock:
+        posted = get_posted_streams()
+        if (url, timestamp) not in posted:
+            posted_at = time.time()
+            posted[(url, timestamp)] = posted_at
+            stream_store.add_posted_stream(url, timestamp, posted_at)
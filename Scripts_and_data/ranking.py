@@ -0,0 +1,63 @@
+import heapq
+
+# Ranking for the leaderboard posts. Only as many accounts as can fit the
+# character budget are ranked, with heapq.nlargest/nsmallest instead of a full
+# sort, and the entries are packed into one or more posts (threaded toots).
+
+MIN_ENTRY_CHARS = 30  # Shortest realistic entry: rank, handle and account URL
+
+def top_ranked(items, k, key, reverse=False):
+    """Same as sorted(items, key=key, reverse=reverse)[:k], ties keep their input order."""
+    if reverse:
+        return heapq.nlargest(k, items, key=key)
+    return heapq.nsmallest(k, items, key=key)
+
+def truncate_entry(entry, room):
+    """Cut an entry to room characters with an ellipsis, keeping its trailing newlines."""
+    text = entry.rstrip("\n")
+    tail = entry[len(text):]
+    keep = room - len(tail) - 1
+    if keep <= 0:
+        return entry[:max(room, 0)]
+    return text[:keep] + "…" + tail
+
+def pack_entries(ranked, format_entry, header, footer, char_limit, max_parts, reserve):
+    """
+    Fill up to max_parts posts with format_entry(rank, item) entries. Returns (parts, full),
+    full is False when ranked ran out before the budget did. An entry too long for a post
+    of its own is truncated so no post goes out without entries.
+    """
+    parts = []
+    content = header
+    has_entries = False
+    for rank, item in enumerate(ranked, start=1):
+        new_entry = format_entry(rank, item)
+        if has_entries and len(content) + len(new_entry) + len(footer) + reserve > char_limit:
+            parts.append(content + footer)
+            if len(parts) == max_parts:
+                return parts, True
+            content = ""
+            has_entries = False
+        room = char_limit - len(content) - len(footer) - reserve
+        if len(new_entry) > room:
+            new_entry = truncate_entry(new_entry, room)
+        content += new_entry
+        has_entries = True
+    parts.append(content + footer)
+    return parts, False
+
+def paginate_ranking(items, key, format_entry, header, footer, char_limit, reverse=False, max_parts=1, reserve=0):
+    """
+    Rank items and pack them into at most max_parts posts of char_limit characters.
+
+    The first post starts with header, every post ends with footer, reserve characters
+    are kept free in each. Returns the list of post texts.
+    """
+    items = list(items)
+    k = max_parts * max(1, char_limit // MIN_ENTRY_CHARS)
+    while True:
+        ranked = top_ranked(items, k, key, reverse)
+        parts, full = pack_entries(ranked, format_entry, header, footer, char_limit, max_parts, reserve)
+        if full or len(ranked) < k:
+            return parts
+        k *= 2  # Entries were shorter than MIN_ENTRY_CHARS, rank further down
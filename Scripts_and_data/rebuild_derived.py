@@ -0,0 +1,107 @@
+import csv
+import os
+import time
+from multiprocessing import Pool
+import stream_store
+import stream_rollups
+from owncast_sessionizer import process_sample
+from Peertube_api_scrapper import CHANNEL_URLS, extract_username_and_instance, parse_iso_datetime
+
+# Rebuilds owncast_streamtime.csv and peertube_data2.csv (and their store tables)
+# from the raw logs owncast_data.csv and peertube_data.csv. Every instance or
+# account is an independent sequence, so they're processed in parallel worker
+# processes and the results are merged in a fixed sort order, which makes the
+# output identical whatever the number of workers.
+#
+#   python rebuild_derived.py
+
+OWNCAST_CSV_FILE = "DATA/owncast_data.csv"
+STREAMTIME_CSV_FILE = "DATA/owncast_streamtime.csv"
+PEERTUBE_CSV_FILE = "DATA/peertube_data.csv"
+OUTPUT_CSV_FILE = "DATA/peertube_data2.csv"
+REBUILD_WORKERS = os.cpu_count() or 1  # Worker processes
+
+def group_rows(rows, key):
+    """Split rows into {key: [rows in file order]}."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(key(row), []).append(row)
+    return groups
+
+def sessionize_instance(samples):
+    """Replay one instance's samples through the sessionizer, returns its closed sessions."""
+    open_sessions = {}
+    last_disconnects = {}
+    sessions = []
+    for sample in samples:
+        for closed in process_sample(open_sessions, last_disconnects, sample):
+            if closed["last_connect_time"] < closed["last_disconnect_time"]:
+                sessions.append(closed)
+    return sessions
+
+def summarize_account(args):
+    """Same rule as Peertube_api_scrapper.main: the latest retrieval of every (account, published_at) wins."""
+    account_url, rows = args
+    entries = {}
+    for retrieval_time, _, video_url, published_at, views in rows:
+        existing = entries.get(published_at)
+        if existing:
+            current_rt = parse_iso_datetime(retrieval_time)
+            existing_rt = parse_iso_datetime(existing["retrieval_time"])
+            if not (current_rt and existing_rt and current_rt > existing_rt):
+                continue
+        entries[published_at] = {
+            "account_url": account_url,
+            "published_at": published_at,
+            "retrieval_time": retrieval_time,
+            "views": views,
+            "video_url": video_url
+        }
+    return list(entries.values())
+
+def write_csv_atomically(file_path, fieldnames, rows):
+    tmp_file = file_path + ".tmp"
+    with open(tmp_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_file, file_path)
+
+def rebuild_owncast(pool):
+    samples = stream_store.read_csv_dicts(OWNCAST_CSV_FILE)
+    by_instance = group_rows(samples, lambda row: row["owncast_url"])
+    sessions = [s for result in pool.map(sessionize_instance, by_instance.values()) for s in result]
+    sessions.sort(key=lambda s: (s["last_disconnect_time"], s["owncast_url"], s["last_connect_time"]))
+    for session in sessions:
+        session["viewer_count"] = session["peak_viewers"]
+    write_csv_atomically(STREAMTIME_CSV_FILE, ["owncast_url", "last_connect_time", "last_disconnect_time", "viewer_count"], sessions)
+    stream_store.replace_owncast_sessions(sessions)
+    return len(samples), len(sessions)
+
+def rebuild_peertube(pool):
+    rows = [row[:5] for row in stream_store.read_csv_lists(PEERTUBE_CSV_FILE)[1:] if len(row) >= 5]
+    channel_url_map = {}
+    for url in CHANNEL_URLS:
+        _, username = extract_username_and_instance(url)
+        channel_url_map[username] = url
+    by_account = group_rows(rows, lambda row: channel_url_map.get(row[1], "N/A"))
+    entries = [e for result in pool.map(summarize_account, by_account.items()) for e in result]
+    entries.sort(key=lambda e: (e["retrieval_time"], e["account_url"], e["published_at"]))
+    write_csv_atomically(OUTPUT_CSV_FILE, ["account_url", "published_at", "retrieval_time", "views", "video_url"], entries)
+    stream_store.replace_peertube_sessions(entries)
+    return len(rows), len(entries)
+
+def main(workers=REBUILD_WORKERS):
+    start = time.time()
+    with Pool(workers) as pool:
+        owncast_rows, owncast_sessions = rebuild_owncast(pool)
+        peertube_rows, peertube_entries = rebuild_peertube(pool)
+    stream_rollups.rebuild_rollups()
+    elapsed = time.time() - start
+    total_rows = owncast_rows + peertube_rows
+    print(f"Rebuilt {owncast_sessions} Owncast sessions from {owncast_rows} samples "
+          f"and {peertube_entries} PeerTube sessions from {peertube_rows} samples.")
+    print(f"{total_rows} rows in {elapsed:.2f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/sec) with {workers} workers")
+
+if __name__ == "__main__":
+    main()
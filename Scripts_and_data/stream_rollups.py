@@ -0,0 +1,167 @@
+import json
+import time
+from datetime import datetime, timedelta
+import pytz
+import stream_store
+import time_of_day
+from leaderboard_stats import (WINDOWS, MIN_SHORT_STREAM, load_sessions, new_window_stats, finish_window_stats,
+                               parse_iso8601, session_order, local_times, add_time_of_day)
+
+# Per-account, per-day (UTC, by session end) rollups of the leaderboard metrics,
+# plus one row per account with its first and last stream end.
+# write_streamtime_to_csv and Peertube_api_scrapper.write_entries_to_csv refresh the
+# buckets a new session lands in, so a leaderboard query reads the buckets of its
+# window and the sessions of the partial first day instead of the full history.
+# Buckets keep the end of their first, longest and most viewed stream and their
+# time of day occupancy, so merging them gives exactly what compute_leaderboards
+# returns for the sessions sorted by leaderboard_stats.session_order.
+
+def iso_utc(dt):
+    return dt.astimezone(pytz.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def day_of(end):
+    """UTC day ('YYYY-MM-DD') of an ISO 8601 session end, None when unparsable."""
+    dt = parse_iso8601(end)
+    return dt.strftime('%Y-%m-%d') if dt else None
+
+def day_bounds(day):
+    start = datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=pytz.utc)
+    return iso_utc(start), iso_utc(start + timedelta(days=1))
+
+def summarize(sessions):
+    """Rollup values of one account's sessions, None when none of them has ended."""
+    sessions = sorted((s for s in sessions if s.end is not None), key=session_order)
+    if not sessions:
+        return None
+    values = {'total_seconds': 0.0, 'stream_count': 0, 'longest': None, 'longest_end': None,
+              'shortest': None, 'shortest_first_end': None, 'max_views': None, 'max_views_end': None,
+              'first_end': sessions[0].end, 'last_end': sessions[-1].end}
+    stats = {'time_of_day': time_of_day.new_occupancy()}
+    for s in sessions:
+        values['total_seconds'] += s.duration
+        values['stream_count'] += 1
+        # Strictly greater, so ties keep the earliest end like the single pass does
+        if values['longest'] is None or values['longest'] < s.duration:
+            values['longest'], values['longest_end'] = s.duration, s.end
+        if values['max_views'] is None or values['max_views'] < s.views:
+            values['max_views'], values['max_views_end'] = s.views, s.end
+        if s.duration >= MIN_SHORT_STREAM:
+            if values['shortest'] is None:
+                values['shortest_first_end'] = s.end
+            if values['shortest'] is None or values['shortest'] > s.duration:
+                values['shortest'] = s.duration
+        if s.start is not None:
+            add_time_of_day(stats, *local_times(s))
+    # Only the non-zero entries of the difference arrays, most days touch a few minutes
+    values['time_of_day'] = json.dumps({key: [[i, v] for i, v in enumerate(diff) if v]
+                                        for key, diff in stats['time_of_day'].items()})
+    return values
+
+def update_buckets(changes):
+    """Recompute the buckets touched by (account, session end) pairs."""
+    if not stream_store.rollups_built():
+        rebuild_rollups()
+        return
+    rollups = {}
+    accounts = set()
+    for account, end in changes:
+        accounts.add(account)
+        day = day_of(end)
+        if day and (account, day) not in rollups:
+            start, stop = day_bounds(day)
+            peertube_rows, owncast_rows = stream_store.load_sessions_ending_between(start, stop, account)
+            rollups[(account, day)] = summarize(load_sessions(peertube_rows, owncast_rows))
+    stream_store.replace_rollups(rollups, accounts)
+
+def rebuild_rollups():
+    """Rebuild every bucket from the stored sessions."""
+    buckets = {}
+    accounts = set()
+    for session in load_sessions(stream_store.load_peertube_sessions(), stream_store.load_owncast_sessions()):
+        accounts.add(session.account)
+        if session.end is not None:
+            day = datetime.fromtimestamp(session.end, pytz.utc).strftime('%Y-%m-%d')
+            buckets.setdefault((session.account, day), []).append(session)
+    stream_store.replace_rollups({key: summarize(sessions) for key, sessions in buckets.items()}, accounts, clear=True)
+    print(f"Rebuilt {len(buckets)} daily rollups.")
+
+def merge_bucket(totals, account, bucket):
+    """Fold one bucket into the per-account totals of a window."""
+    merged = totals.get(account)
+    if merged is None:
+        totals[account] = dict(bucket)
+        return
+    merged['total_seconds'] += bucket['total_seconds']
+    merged['stream_count'] += bucket['stream_count']
+    for key, end_key in (('longest', 'longest_end'), ('max_views', 'max_views_end')):
+        if (merged[key], -merged[end_key]) < (bucket[key], -bucket[end_key]):
+            merged[key], merged[end_key] = bucket[key], bucket[end_key]
+    if bucket['shortest'] is not None:
+        if merged['shortest'] is None or merged['shortest'] > bucket['shortest']:
+            merged['shortest'] = bucket['shortest']
+        if merged['shortest_first_end'] is None or merged['shortest_first_end'] > bucket['shortest_first_end']:
+            merged['shortest_first_end'] = bucket['shortest_first_end']
+    merged['first_end'] = min(merged['first_end'], bucket['first_end'])
+    merged['last_end'] = max(merged['last_end'], bucket['last_end'])
+
+def add_bucket_time_of_day(stats, bucket):
+    occupancy = stats['time_of_day']
+    for key, entries in json.loads(bucket['time_of_day']).items():
+        diff = occupancy[key]
+        for index, delta in entries:
+            diff[index] += delta
+
+def window_stats(totals):
+    """Turn the per-account totals into new_window_stats() dicts, in the single pass' insertion order."""
+    stats = new_window_stats()
+    for account in sorted(totals, key=lambda a: (totals[a]['first_end'], a)):
+        values = totals[account]
+        stats['longest'][account] = (values['longest_end'], values['longest'])
+        stats['views'][account] = (values['max_views_end'], values['max_views'])
+        stats['total_time'][account] = values['total_seconds']
+        stats['count'][account] = values['stream_count']
+        stats['total_seconds'] += values['total_seconds']
+        stats['streams'] += values['stream_count']
+    short_enough = [a for a in totals if totals[a]['shortest'] is not None]
+    for account in sorted(short_enough, key=lambda a: (totals[a]['shortest_first_end'], a)):
+        stats['shortest'][account] = totals[account]['shortest']
+    return stats
+
+def compute_leaderboards_from_rollups(windows=WINDOWS, now=None):
+    """
+    Same result as leaderboard_stats.compute_leaderboards over the stored sessions sorted
+    by session_order, answered from the daily and account rollups.
+    """
+    if not stream_store.rollups_built():
+        rebuild_rollups()
+    now = now if now is not None else time.time()
+    result = {'windows': {}, 'recent': {}, 'accounts': []}
+
+    for days in windows:
+        threshold = now - days * 86400
+        boundary_day = datetime.fromtimestamp(threshold, pytz.utc).strftime('%Y-%m-%d')
+
+        # The first day is only partly inside the window, so its sessions are summarized here
+        peertube_rows, owncast_rows = stream_store.load_sessions_ending_between(
+            iso_utc(datetime.fromtimestamp(threshold, pytz.utc)), day_bounds(boundary_day)[1])
+        partial = {}
+        for session in load_sessions(peertube_rows, owncast_rows):
+            if session.end is not None and session.end >= threshold:
+                partial.setdefault(session.account, []).append(session)
+        buckets = [dict(summarize(sessions), account=account) for account, sessions in partial.items()]
+        buckets += stream_store.load_rollups_after(boundary_day)
+
+        totals = {}
+        occupancy = {'time_of_day': time_of_day.new_occupancy()}
+        for bucket in buckets:
+            merge_bucket(totals, bucket['account'], bucket)
+            add_bucket_time_of_day(occupancy, bucket)
+        stats = window_stats(totals)
+        stats.update(occupancy)
+        result['windows'][days] = finish_window_stats(stats)
+
+    for account, first_end, last_end in stream_store.load_account_rollups():
+        result['accounts'].append(account)
+        if last_end is not None:
+            result['recent'][account] = datetime.fromtimestamp(last_end, pytz.utc)
+    return result
@@ -0,0 +1,586 @@
+import csv
+import os
+import sqlite3
+import threading
+import time
+
+# SQLite store for everything the scrapers and bots record.
+# The CSV files in DATA/ are still appended to as a plain-text log, but every
+# read goes through the indexed tables below instead of re-parsing whole files.
+# On first use the existing CSVs are imported once.
+
+DB_FILE = "DATA/stream_data.db"
+OWNCAST_CSV_FILE = "DATA/owncast_data.csv"
+STREAMTIME_CSV_FILE = "DATA/owncast_streamtime.csv"
+PEERTUBE_CSV_FILE = "DATA/peertube_data.csv"
+PEERTUBE_SUMMARY_CSV_FILE = "DATA/peertube_data2.csv"
+POSTED_CSV_FILE = "DATA/live_streams_posted.csv"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS owncast_samples (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT,
+    owncast_url TEXT,
+    last_connect_time TEXT,
+    last_disconnect_time TEXT,
+    viewer_count TEXT
+);
+CREATE INDEX IF NOT EXISTS owncast_samples_url_time ON owncast_samples (owncast_url, timestamp);
+CREATE TABLE IF NOT EXISTS owncast_sessions (
+    id INTEGER PRIMARY KEY,
+    owncast_url TEXT,
+    last_connect_time TEXT,
+    last_disconnect_time TEXT,
+    viewer_count TEXT
+);
+CREATE INDEX IF NOT EXISTS owncast_sessions_url_time ON owncast_sessions (owncast_url, last_disconnect_time);
+CREATE INDEX IF NOT EXISTS owncast_sessions_time ON owncast_sessions (last_disconnect_time);
+CREATE TABLE IF NOT EXISTS owncast_open_sessions (
+    owncast_url TEXT PRIMARY KEY,
+    last_connect_time TEXT,
+    last_seen TEXT,
+    peak_viewers INTEGER,
+    viewer_sum INTEGER,
+    sample_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS owncast_last_disconnect (
+    owncast_url TEXT PRIMARY KEY,
+    last_disconnect_time TEXT
+);
+CREATE TABLE IF NOT EXISTS peertube_samples (
+    id INTEGER PRIMARY KEY,
+    retrieval_time TEXT,
+    account TEXT,
+    video_url TEXT,
+    published_at TEXT,
+    views TEXT
+);
+CREATE INDEX IF NOT EXISTS peertube_samples_url_time ON peertube_samples (video_url, retrieval_time);
+CREATE INDEX IF NOT EXISTS peertube_samples_time ON peertube_samples (retrieval_time);
+CREATE TABLE IF NOT EXISTS peertube_sessions (
+    account_url TEXT,
+    published_at TEXT,
+    retrieval_time TEXT,
+    views TEXT,
+    video_url TEXT,
+    PRIMARY KEY (account_url, published_at)
+);
+CREATE INDEX IF NOT EXISTS peertube_sessions_time ON peertube_sessions (retrieval_time);
+CREATE INDEX IF NOT EXISTS peertube_sessions_account_time ON peertube_sessions (account_url, retrieval_time);
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    account TEXT,
+    day TEXT,
+    total_seconds REAL,
+    stream_count INTEGER,
+    longest REAL,
+    longest_end REAL,
+    shortest REAL,
+    shortest_first_end REAL,
+    max_views INTEGER,
+    max_views_end REAL,
+    first_end REAL,
+    last_end REAL,
+    time_of_day TEXT,
+    PRIMARY KEY (account, day)
+);
+CREATE INDEX IF NOT EXISTS daily_rollups_day ON daily_rollups (day);
+CREATE TABLE IF NOT EXISTS account_rollups (
+    account TEXT PRIMARY KEY,
+    first_end REAL,
+    last_end REAL
+);
+CREATE INDEX IF NOT EXISTS account_rollups_first_end ON account_rollups (first_end IS NULL, first_end, account);
+CREATE TABLE IF NOT EXISTS posted_streams (
+    url TEXT,
+    timestamp TEXT,
+    posted_at REAL,
+    PRIMARY KEY (url, timestamp)
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    url TEXT,
+    published_at TEXT,
+    message TEXT,
+    visibility TEXT,
+    status TEXT,
+    attempts INTEGER DEFAULT 0,
+    next_attempt REAL,
+    last_error TEXT,
+    created REAL,
+    PRIMARY KEY (url, published_at)
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt);
+CREATE TABLE IF NOT EXISTS hashtag_cache (
+    title_key TEXT PRIMARY KEY,
+    hashtags TEXT,
+    created REAL,
+    last_used REAL,
+    hits INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS hashtag_cache_last_used ON hashtag_cache (last_used);
+CREATE TABLE IF NOT EXISTS lemmy_logins (
+    instance TEXT,
+    username TEXT,
+    jwt TEXT,
+    expires_at REAL,
+    PRIMARY KEY (instance, username)
+);
+"""
+
+_connections = {}
+_lock = threading.RLock()
+_thread_paths = threading.local()
+
+def bind_thread(db_path):
+    """Pin the current thread to a database path, for background threads outliving the working directory."""
+    _thread_paths.path = db_path
+
+def get_connection():
+    """Return the process wide connection to DB_FILE, creating the schema and importing the CSVs on first use."""
+    path = getattr(_thread_paths, "path", None) or os.path.abspath(DB_FILE)
+    with _lock:
+        conn = _connections.get(path)
+        if conn is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            _connections[path] = conn
+            if get_meta(conn, "csv_imported") is None:
+                import_csvs(conn)
+            if get_meta(conn, "session_dedup_index") is None:
+                create_session_dedup_index(conn)
+            sync_streamtime_csv(conn)
+        return conn
+
+def get_meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+def set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+def bump_sessions_revision(conn):
+    """Count a change to the stored sessions, called inside the writing transaction."""
+    conn.execute("INSERT INTO meta (key, value) VALUES ('sessions_revision', '1') "
+                 "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+def get_sessions_revision():
+    """Version of the stored sessions, changes whenever a session is added or updated."""
+    with _lock:
+        return int(get_meta(get_connection(), "sessions_revision") or 0)
+
+def csv_signature(file_path):
+    """Return 'size:mtime' of a file, used to tell whether the store is in sync with it."""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def record_csv_signature(file_path):
+    """Remember the current signature of a CSV after the store and the file were updated together."""
+    conn = get_connection()
+    with _lock, conn:
+        set_meta(conn, f"csv_signature:{file_path}", csv_signature(file_path))
+
+def read_csv_dicts(file_path):
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, "r", newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def read_csv_lists(file_path):
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, "r", newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+def import_csvs(conn):
+    """One-time import of the existing CSV files into the store."""
+    with _lock, conn:
+        conn.executemany(
+            "INSERT INTO owncast_samples (timestamp, owncast_url, last_connect_time, last_disconnect_time, viewer_count) "
+            "VALUES (:timestamp, :owncast_url, :last_connect_time, :last_disconnect_time, :viewer_count)",
+            read_csv_dicts(OWNCAST_CSV_FILE))
+        # owncast_streamtime.csv is loaded by sync_streamtime_csv
+        conn.executemany(
+            "INSERT INTO peertube_samples (retrieval_time, account, video_url, published_at, views) VALUES (?, ?, ?, ?, ?)",
+            [row[:5] for row in read_csv_lists(PEERTUBE_CSV_FILE)[1:] if len(row) >= 5])
+        conn.executemany(
+            "INSERT OR REPLACE INTO peertube_sessions (account_url, published_at, retrieval_time, views, video_url) "
+            "VALUES (:account_url, :published_at, :retrieval_time, :views, :video_url)",
+            read_csv_dicts(PEERTUBE_SUMMARY_CSV_FILE))
+        bump_sessions_revision(conn)
+        # The CSV has no posting time, count the imported notifications as posted now
+        now = time.time()
+        conn.executemany(
+            "INSERT OR IGNORE INTO posted_streams (url, timestamp, posted_at) VALUES (?, ?, ?)",
+            [(row[0], row[1] if len(row) > 1 else "", now) for row in read_csv_lists(POSTED_CSV_FILE) if row])
+        set_meta(conn, "csv_imported", "1")
+    print(f"Imported existing CSV data into {DB_FILE}")
+
+# Owncast
+
+def add_owncast_sample(timestamp, owncast_url, last_connect_time, last_disconnect_time, viewer_count):
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute(
+            "INSERT INTO owncast_samples (timestamp, owncast_url, last_connect_time, last_disconnect_time, viewer_count) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (timestamp, owncast_url, last_connect_time, last_disconnect_time, str(viewer_count)))
+
+def create_session_dedup_index(conn):
+    """Drop duplicate sessions and add the unique (url, connect, disconnect) index used for dedup."""
+    with _lock, conn:
+        conn.execute(
+            "DELETE FROM owncast_sessions WHERE id NOT IN ("
+            "SELECT MIN(id) FROM owncast_sessions GROUP BY owncast_url, last_connect_time, last_disconnect_time)")
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS owncast_sessions_unique "
+            "ON owncast_sessions (owncast_url, last_connect_time, last_disconnect_time)")
+        set_meta(conn, "session_dedup_index", "1")
+
+def sync_streamtime_csv(conn):
+    """Load owncast_streamtime.csv into the store, only when the file changed since it was last recorded."""
+    signature = csv_signature(STREAMTIME_CSV_FILE)
+    key = f"csv_signature:{STREAMTIME_CSV_FILE}"
+    if signature == get_meta(conn, key):
+        return
+    with _lock, conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO owncast_sessions (owncast_url, last_connect_time, last_disconnect_time, viewer_count) "
+            "VALUES (:owncast_url, :last_connect_time, :last_disconnect_time, :viewer_count)",
+            read_csv_dicts(STREAMTIME_CSV_FILE))
+        set_meta(conn, key, signature)
+        bump_sessions_revision(conn)
+        conn.execute("DELETE FROM meta WHERE key = 'daily_rollups'")  # Sessions were added behind the rollups' back
+
+def add_owncast_session(owncast_url, last_connect_time, last_disconnect_time, viewer_count):
+    """Record a session, returns False when the same (url, connect, disconnect) was already recorded."""
+    conn = get_connection()
+    with _lock, conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO owncast_sessions (owncast_url, last_connect_time, last_disconnect_time, viewer_count) "
+            "VALUES (?, ?, ?, ?)",
+            (owncast_url, last_connect_time, last_disconnect_time, viewer_count))
+        if cursor.rowcount == 1:
+            bump_sessions_revision(conn)
+    return cursor.rowcount == 1
+
+def load_owncast_sessions(since=None):
+    """Return Owncast sessions as dicts shaped like owncast_streamtime.csv rows, optionally ending at or after since."""
+    query = "SELECT owncast_url, last_connect_time, last_disconnect_time, viewer_count FROM owncast_sessions"
+    params = ()
+    if since:
+        query += " WHERE last_disconnect_time >= ?"
+        params = (since,)
+    with _lock:
+        return [dict(row) for row in get_connection().execute(query + " ORDER BY id", params)]
+
+def replace_owncast_sessions(sessions):
+    """Replace every Owncast session, used by rebuild_derived.py."""
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute("DELETE FROM owncast_sessions")
+        conn.executemany(
+            "INSERT OR IGNORE INTO owncast_sessions (owncast_url, last_connect_time, last_disconnect_time, viewer_count) "
+            "VALUES (:owncast_url, :last_connect_time, :last_disconnect_time, :peak_viewers)",
+            sessions)
+        set_meta(conn, f"csv_signature:{STREAMTIME_CSV_FILE}", csv_signature(STREAMTIME_CSV_FILE))
+        bump_sessions_revision(conn)
+        conn.execute("DELETE FROM meta WHERE key = 'daily_rollups'")
+
+def load_owncast_samples_after(sample_id, limit):
+    """Return up to limit samples recorded after sample_id, oldest first, with their id."""
+    with _lock:
+        return [dict(row) for row in get_connection().execute(
+            "SELECT id, timestamp, owncast_url, last_connect_time, last_disconnect_time, viewer_count "
+            "FROM owncast_samples WHERE id > ? ORDER BY id LIMIT ?", (sample_id, limit))]
+
+def load_sessionizer_state():
+    """Return (checkpoint sample id, {owncast_url: open session dict}, {owncast_url: last disconnect time})."""
+    with _lock:
+        conn = get_connection()
+        open_sessions = {row["owncast_url"]: dict(row) for row in conn.execute("SELECT * FROM owncast_open_sessions")}
+        last_disconnects = {row["owncast_url"]: row["last_disconnect_time"]
+                            for row in conn.execute("SELECT * FROM owncast_last_disconnect")}
+        return int(get_meta(conn, "sessionizer_checkpoint") or 0), open_sessions, last_disconnects
+
+def save_sessionizer_state(checkpoint, open_sessions, last_disconnects):
+    """Atomically store the checkpoint and the per-instance state."""
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute("DELETE FROM owncast_open_sessions")
+        conn.executemany(
+            "INSERT INTO owncast_open_sessions (owncast_url, last_connect_time, last_seen, peak_viewers, viewer_sum, sample_count) "
+            "VALUES (:owncast_url, :last_connect_time, :last_seen, :peak_viewers, :viewer_sum, :sample_count)",
+            list(open_sessions.values()))
+        conn.executemany(
+            "INSERT OR REPLACE INTO owncast_last_disconnect (owncast_url, last_disconnect_time) VALUES (?, ?)",
+            list(last_disconnects.items()))
+        set_meta(conn, "sessionizer_checkpoint", str(checkpoint))
+
+# PeerTube
+
+def add_peertube_sample(retrieval_time, account, video_url, published_at, views):
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute(
+            "INSERT INTO peertube_samples (retrieval_time, account, video_url, published_at, views) VALUES (?, ?, ?, ?, ?)",
+            (retrieval_time, account, video_url, published_at, str(views)))
+
+def load_peertube_samples(since=None):
+    """Return PeerTube samples shaped like Peertube_api_scrapper.read_csv_rows(), optionally retrieved at or after since."""
+    query = ("SELECT retrieval_time AS csv_retrieval_time, account AS csv_account, video_url, "
+             "published_at AS csv_published_at, views AS csv_views FROM peertube_samples")
+    params = ()
+    if since:
+        query += " WHERE retrieval_time >= ?"
+        params = (since,)
+    with _lock:
+        return [dict(row) for row in get_connection().execute(query + " ORDER BY id", params)]
+
+def upsert_peertube_sessions(entries):
+    """
+    Insert or update PeerTube sessions keyed on (account_url, published_at).
+
+    Returns the (account_url, retrieval_time) pairs that changed, both the previous and
+    the new retrieval time of updated sessions, so the daily rollups can be refreshed.
+    """
+    entries = list(entries)
+    changed = set()
+    conn = get_connection()
+    with _lock, conn:
+        for entry in entries:
+            previous = conn.execute(
+                "SELECT retrieval_time, views, video_url FROM peertube_sessions WHERE account_url = ? AND published_at = ?",
+                (entry["account_url"], entry["published_at"])).fetchone()
+            # Every run rewrites all entries, unchanged ones don't touch the rollups or the revision
+            if previous and tuple(previous) == (entry["retrieval_time"], str(entry["views"]), entry["video_url"]):
+                continue
+            if previous:
+                changed.add((entry["account_url"], previous["retrieval_time"]))
+            changed.add((entry["account_url"], entry["retrieval_time"]))
+        conn.executemany(
+            "INSERT OR REPLACE INTO peertube_sessions (account_url, published_at, retrieval_time, views, video_url) "
+            "VALUES (:account_url, :published_at, :retrieval_time, :views, :video_url)",
+            entries)
+        if changed:
+            bump_sessions_revision(conn)
+    return changed
+
+def replace_peertube_sessions(entries):
+    """Replace every PeerTube session, used by rebuild_derived.py."""
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute("DELETE FROM peertube_sessions")
+        conn.executemany(
+            "INSERT OR REPLACE INTO peertube_sessions (account_url, published_at, retrieval_time, views, video_url) "
+            "VALUES (:account_url, :published_at, :retrieval_time, :views, :video_url)",
+            entries)
+        bump_sessions_revision(conn)
+        conn.execute("DELETE FROM meta WHERE key = 'daily_rollups'")
+
+def load_sessions_ending_between(start, end, account=None):
+    """Return (peertube_rows, owncast_rows) of sessions ending in [start, end), optionally for one account."""
+    peertube_query = ("SELECT account_url, published_at, retrieval_time, views, video_url FROM peertube_sessions "
+                      "WHERE retrieval_time >= ? AND retrieval_time < ?")
+    owncast_query = ("SELECT owncast_url, last_connect_time, last_disconnect_time, viewer_count FROM owncast_sessions "
+                     "WHERE last_disconnect_time >= ? AND last_disconnect_time < ?")
+    params = (start, end)
+    if account is not None:
+        peertube_query += " AND account_url = ?"
+        owncast_query += " AND owncast_url = ?"
+        params = (start, end, account)
+    with _lock:
+        conn = get_connection()
+        return ([dict(row) for row in conn.execute(peertube_query + " ORDER BY rowid", params)],
+                [dict(row) for row in conn.execute(owncast_query + " ORDER BY id", params)])
+
+def longest_peertube_session():
+    """Return the longest recorded PeerTube session in seconds (0 when there are none)."""
+    with _lock:
+        row = get_connection().execute(
+            "SELECT MAX((julianday(retrieval_time) - julianday(published_at)) * 86400) AS longest FROM peertube_sessions"
+        ).fetchone()
+    return row["longest"] or 0
+
+def load_peertube_sessions(since=None):
+    """Return PeerTube sessions as dicts shaped like peertube_data2.csv rows, optionally retrieved at or after since."""
+    query = "SELECT account_url, published_at, retrieval_time, views, video_url FROM peertube_sessions"
+    params = ()
+    if since:
+        query += " WHERE retrieval_time >= ?"
+        params = (since,)
+    with _lock:
+        return [dict(row) for row in get_connection().execute(query + " ORDER BY rowid", params)]
+
+# Daily rollups
+
+def rollups_built():
+    with _lock:
+        return get_meta(get_connection(), "daily_rollups") is not None
+
+def replace_rollups(rollups, accounts=(), clear=False):
+    """
+    Write {(account, day): values or None} to daily_rollups, None deletes the bucket,
+    then refresh the account_rollups row of every account in accounts from its first
+    and last bucket.
+    """
+    conn = get_connection()
+    with _lock, conn:
+        if clear:
+            conn.execute("DELETE FROM daily_rollups")
+            conn.execute("DELETE FROM account_rollups")
+        for (account, day), values in rollups.items():
+            if values is None:
+                conn.execute("DELETE FROM daily_rollups WHERE account = ? AND day = ?", (account, day))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO daily_rollups "
+                    "(account, day, total_seconds, stream_count, longest, longest_end, shortest, shortest_first_end, "
+                    "max_views, max_views_end, first_end, last_end, time_of_day) "
+                    "VALUES (:account, :day, :total_seconds, :stream_count, :longest, :longest_end, :shortest, "
+                    ":shortest_first_end, :max_views, :max_views_end, :first_end, :last_end, :time_of_day)",
+                    dict(values, account=account, day=day))
+        for account in accounts:
+            first = conn.execute("SELECT first_end FROM daily_rollups WHERE account = ? ORDER BY day LIMIT 1",
+                                 (account,)).fetchone()
+            last = conn.execute("SELECT last_end FROM daily_rollups WHERE account = ? ORDER BY day DESC LIMIT 1",
+                                (account,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO account_rollups (account, first_end, last_end) VALUES (?, ?, ?)",
+                         (account, first["first_end"] if first else None, last["last_end"] if last else None))
+        if clear:
+            set_meta(conn, "daily_rollups", "1")
+
+def load_rollups_after(day):
+    """Return every bucket strictly after day."""
+    with _lock:
+        return [dict(row) for row in get_connection().execute("SELECT * FROM daily_rollups WHERE day > ?", (day,))]
+
+def load_account_rollups():
+    """Return (account, first_end, last_end) of every account, ordered by first end, accounts without one last."""
+    with _lock:
+        return [tuple(row) for row in get_connection().execute(
+            "SELECT account, first_end, last_end FROM account_rollups "
+            "ORDER BY first_end IS NULL, first_end, account")]
+
+# Posted notifications
+
+def add_posted_stream(url, timestamp, posted_at):
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute("INSERT OR IGNORE INTO posted_streams (url, timestamp, posted_at) VALUES (?, ?, ?)",
+                     (url, timestamp, posted_at))
+
+def delete_posted_streams_before(cutoff):
+    """Delete notifications posted before the epoch time cutoff, returns how many were removed."""
+    conn = get_connection()
+    with _lock, conn:
+        cursor = conn.execute("DELETE FROM posted_streams WHERE posted_at < ?", (cutoff,))
+    return cursor.rowcount
+
+def load_posted_streams():
+    """Return every posted notification as {(url, timestamp): posted_at}."""
+    with _lock:
+        return {(row["url"], row["timestamp"]): row["posted_at"]
+                for row in get_connection().execute("SELECT url, timestamp, posted_at FROM posted_streams")}
+
+# Outbox
+
+def enqueue_outbox(url, published_at, message, visibility, now):
+    """Queue a message once per (url, published_at), returns False when it was already queued."""
+    conn = get_connection()
+    with _lock, conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO outbox (url, published_at, message, visibility, status, attempts, next_attempt, created) "
+            "VALUES (?, ?, ?, ?, 'pending', 0, ?, ?)",
+            (url, published_at, message, visibility, now, now))
+    return cursor.rowcount == 1
+
+def is_in_outbox(url, published_at):
+    with _lock:
+        return get_connection().execute(
+            "SELECT 1 FROM outbox WHERE url = ? AND published_at = ?", (url, published_at)).fetchone() is not None
+
+def load_due_outbox(now, limit):
+    """Return pending messages due at now, oldest first."""
+    with _lock:
+        return [dict(row) for row in get_connection().execute(
+            "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt <= ? ORDER BY created LIMIT ?", (now, limit))]
+
+def next_outbox_attempt():
+    """Time of the earliest pending attempt, None when nothing is pending."""
+    with _lock:
+        row = get_connection().execute("SELECT MIN(next_attempt) AS next_attempt FROM outbox WHERE status = 'pending'").fetchone()
+    return row["next_attempt"]
+
+def update_outbox(url, published_at, status, attempts, next_attempt=None, last_error=None):
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute(
+            "UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE url = ? AND published_at = ?",
+            (status, attempts, next_attempt, last_error, url, published_at))
+
+def delete_outbox_before(cutoff):
+    """Delete sent or failed messages created before cutoff."""
+    conn = get_connection()
+    with _lock, conn:
+        return conn.execute("DELETE FROM outbox WHERE status != 'pending' AND created < ?", (cutoff,)).rowcount
+
+# Hashtag cache
+
+def get_cached_hashtags(title_key, now, max_age):
+    """Return the hashtags cached for title_key if newer than max_age, counting the hit or miss."""
+    conn = get_connection()
+    with _lock, conn:
+        row = conn.execute("SELECT hashtags FROM hashtag_cache WHERE title_key = ? AND created >= ?",
+                           (title_key, now - max_age)).fetchone()
+        if row:
+            conn.execute("UPDATE hashtag_cache SET last_used = ?, hits = hits + 1 WHERE title_key = ?", (now, title_key))
+        counter = "hashtag_cache_hits" if row else "hashtag_cache_misses"
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, '1') "
+                     "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (counter,))
+    return row["hashtags"] if row else None
+
+def put_cached_hashtags(title_key, hashtags, now, max_age, max_entries):
+    """Cache hashtags for title_key, then drop expired entries and the least recently used beyond max_entries."""
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute("INSERT OR REPLACE INTO hashtag_cache (title_key, hashtags, created, last_used, hits) "
+                     "VALUES (?, ?, ?, ?, 0)", (title_key, hashtags, now, now))
+        conn.execute("DELETE FROM hashtag_cache WHERE created < ?", (now - max_age,))
+        conn.execute("DELETE FROM hashtag_cache WHERE title_key IN ("
+                     "SELECT title_key FROM hashtag_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (max_entries,))
+
+def hashtag_cache_stats():
+    """Return (entries, hits, misses) of the hashtag cache."""
+    with _lock:
+        conn = get_connection()
+        entries = conn.execute("SELECT COUNT(*) FROM hashtag_cache").fetchone()[0]
+        return entries, int(get_meta(conn, "hashtag_cache_hits") or 0), int(get_meta(conn, "hashtag_cache_misses") or 0)
+
+# Lemmy logins
+
+def get_lemmy_login(instance, username):
+    """Return the stored (jwt, expires_at) of an account, None when there is none."""
+    with _lock:
+        row = get_connection().execute("SELECT jwt, expires_at FROM lemmy_logins WHERE instance = ? AND username = ?",
+                                       (instance, username)).fetchone()
+    return (row["jwt"], row["expires_at"]) if row else None
+
+def put_lemmy_login(instance, username, jwt, expires_at):
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute("INSERT OR REPLACE INTO lemmy_logins (instance, username, jwt, expires_at) VALUES (?, ?, ?, ?)",
+                     (instance, username, jwt, expires_at))
+
+def delete_lemmy_login(instance, username):
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute("DELETE FROM lemmy_logins WHERE instance = ? AND username = ?", (instance, username))
@@ -0,0 +1,88 @@
+from datetime import datetime
+import pytz
+
+# Time of day occupancy shared by the leaderboard backends. Streams are added to
+# two difference arrays, one per minute of the day and one per hour, which makes
+# adding a stream O(1). summarize() runs a single prefix sum over them and returns
+# the hourly histogram, the coverage intervals and the concurrent streamers curve.
+
+MINUTES_PER_DAY = 1440
+
+def new_occupancy():
+    return {
+        'minutes': [0] * (MINUTES_PER_DAY + 1),  # Difference array, minute of day -> streams live
+        'hours': [0] * 25,  # Difference array, hour of day -> streams active during it
+    }
+
+def add_stream(occupancy, start_sec, end_sec, days=0):
+    """
+    Add one stream given its local start and end seconds of day, wrapping past midnight.
+    days counts the whole days it ran on top of that: each adds one to every minute,
+    and any of them makes the stream active during every hour.
+    """
+    start_min = int(start_sec) // 60
+    end_min = min(int(end_sec) // 60, MINUTES_PER_DAY - 1)
+    if start_sec <= end_sec:
+        ranges = ((start_min, end_min),)
+    else:
+        ranges = ((start_min, MINUTES_PER_DAY - 1), (0, end_min))
+    minutes = occupancy['minutes']
+    hours = occupancy['hours']
+    minutes[0] += days
+    minutes[MINUTES_PER_DAY] -= days
+    if days:
+        hours[0] += 1
+        hours[24] -= 1
+    for first, last in ranges:
+        minutes[first] += 1
+        minutes[last + 1] -= 1
+        if not days:
+            hours[first // 60] += 1
+            hours[last // 60 + 1] -= 1
+
+def local_span(start, end, tz=pytz.utc):
+    """Return (start second of day, end second of day, whole days) of an epoch second start and end in tz."""
+    start_local = datetime.fromtimestamp(start, tz)
+    end_local = datetime.fromtimestamp(end, tz)
+    start_sec = start_local.hour * 3600 + start_local.minute * 60 + start_local.second
+    end_sec = end_local.hour * 3600 + end_local.minute * 60 + end_local.second
+    days = (end_local.date() - start_local.date()).days
+    if end_sec < start_sec:
+        days -= 1  # The last day is the part wrapping past midnight
+    return start_sec, end_sec, max(days, 0)
+
+def add_session(occupancy, start, end, tz=pytz.utc):
+    """Add one stream given epoch second start and end, in the time zone tz."""
+    add_stream(occupancy, *local_span(start, end, tz))
+
+def summarize(occupancy):
+    """
+    Returns {'hour_counts': {hour: streams}, 'concurrent': [streams live per minute],
+    'coverage': [(start, end) seconds of day with at least one stream live]}.
+    """
+    hour_counts = {}
+    live = 0
+    for h in range(24):
+        live += occupancy['hours'][h]
+        hour_counts[h] = live
+
+    concurrent = []
+    coverage = []
+    live = 0
+    for minute in range(MINUTES_PER_DAY):
+        live += occupancy['minutes'][minute]
+        concurrent.append(live)
+        if live:
+            if coverage and coverage[-1][1] == minute * 60:
+                coverage[-1] = (coverage[-1][0], (minute + 1) * 60)
+            else:
+                coverage.append((minute * 60, (minute + 1) * 60))
+    return {'hour_counts': hour_counts, 'concurrent': concurrent, 'coverage': coverage}
+
+def occupancy_of(sessions, tz=pytz.utc):
+    """Summarize StreamSession records in any time zone."""
+    occupancy = new_occupancy()
+    for session in sessions:
+        if session.start is not None and session.end is not None:
+            add_session(occupancy, session.start, session.end, tz)
+    return summarize(occupancy)
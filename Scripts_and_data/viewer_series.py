@@ -0,0 +1,152 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+# Compact per-instance viewer count time series. Every instance gets a folder of
+# append-only monthly segments. A sample is one record:
+# a length byte, then two varints, the zigzag encoded seconds since the previous
+# sample of the segment (the first one counts from the start of the month) and
+# the viewer count. A minute-resolution month is ~44k samples, about 130 KB.
+# The length prefix frames every record, so a record torn by a crash is cut off
+# before the next append instead of shifting every later sample.
+
+SERIES_FOLDER = "DATA/viewer_series"
+SEGMENT_EXTENSION = ".vs"
+SEGMENT_CACHE_SIZE = 16  # Decoded segments kept in memory, keyed on path, size and mtime
+
+_lock = threading.Lock()
+_last_timestamps = {}  # segment path -> timestamp of its last sample
+_segment_cache = OrderedDict()  # path -> ((size, mtime), samples)
+
+def encode_varint(value, out):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varints(data):
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = shift = 0
+
+def zigzag(n):
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+def unzigzag(n):
+    return n >> 1 if not n & 1 else -(n >> 1) - 1
+
+def month_start(timestamp):
+    dt = datetime.fromtimestamp(timestamp, timezone.utc)
+    return int(datetime(dt.year, dt.month, 1, tzinfo=timezone.utc).timestamp())
+
+def next_month_start(start):
+    dt = datetime.fromtimestamp(start, timezone.utc)
+    year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+    return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+
+def series_folder(url):
+    return os.path.join(SERIES_FOLDER, urlparse(url).netloc or url.strip("/").replace("/", "_"))
+
+def segment_path(url, start):
+    return os.path.join(series_folder(url), datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m") + SEGMENT_EXTENSION)
+
+def decode_segment(data, start):
+    """Decode framed records into ([(timestamp, viewers)], length of the intact prefix)."""
+    samples = []
+    timestamp = start
+    pos = 0
+    while pos < len(data):
+        end = pos + 1 + data[pos]
+        if end > len(data):
+            break  # Torn last record
+        values = list(decode_varints(data[pos + 1:end]))
+        if len(values) != 2:
+            break
+        timestamp += unzigzag(values[0])
+        samples.append((timestamp, values[1]))
+        pos = end
+    return samples, pos
+
+def read_segment(path, start):
+    """Decode one segment into [(timestamp, viewers)], cached until the file changes."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return []
+    version = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        cached = _segment_cache.get(path)
+        if cached and cached[0] == version:
+            _segment_cache.move_to_end(path)
+            return cached[1]
+    with open(path, "rb") as f:
+        data = f.read()
+    samples = decode_segment(data, start)[0]
+    with _lock:
+        _segment_cache[path] = (version, samples)
+        while len(_segment_cache) > SEGMENT_CACHE_SIZE:
+            _segment_cache.popitem(last=False)
+    return samples
+
+def append(url, timestamp, viewers):
+    """Record one viewer count sample (epoch seconds) for an instance."""
+    timestamp = int(timestamp)
+    start = month_start(timestamp)
+    path = segment_path(url, start)
+    with _lock:
+        if path not in _last_timestamps:
+            # First append to this segment in the process: drop a record torn by an earlier crash
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = b""
+            samples, intact = decode_segment(data, start)
+            if intact < len(data):
+                with open(path, "r+b") as f:
+                    f.truncate(intact)
+            _last_timestamps[path] = samples[-1][0] if samples else start
+        payload = bytearray()
+        encode_varint(zigzag(timestamp - _last_timestamps[path]), payload)
+        encode_varint(max(0, int(viewers)), payload)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            f.write(bytes([len(payload)]) + payload)
+        _last_timestamps[path] = timestamp
+
+def load(url, start, end):
+    """Return the [(timestamp, viewers)] samples of an instance with start <= timestamp < end."""
+    samples = []
+    segment = month_start(start)
+    while segment < end:
+        samples.extend(s for s in read_segment(segment_path(url, segment), segment) if start <= s[0] < end)
+        segment = next_month_start(segment)
+    return samples
+
+def nearest_rank(counts, q):
+    """q-th percentile (0-100) of already sorted counts, nearest-rank method."""
+    rank = max(1, -(-len(counts) * q // 100))  # Ceiling without floats
+    return counts[min(len(counts), int(rank)) - 1]
+
+def window_stats(url, start, end):
+    """Peak, mean, median and 95th percentile of an instance's viewers in one read, None without samples."""
+    samples = load(url, start, end)
+    if not samples:
+        return None
+    counts = sorted(viewers for _, viewers in samples)
+    return {
+        "samples": len(counts),
+        "first": samples[0][0],
+        "last": samples[-1][0],
+        "peak": counts[-1],
+        "mean": sum(counts) / len(counts),
+        "median": nearest_rank(counts, 50),
+        "p95": nearest_rank(counts, 95),
+    }
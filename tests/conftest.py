@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+# The scripts import each other by module name from Scripts_and_data
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Scripts_and_data"))
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Run every test in an empty working directory, the scripts keep their files under DATA/."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("DATA")
+    # Per-process caches keyed on relative paths, as if every test was a fresh run
+    import viewer_series
+    monkeypatch.setattr(viewer_series, "_last_timestamps", {})
+    monkeypatch.setattr(viewer_series, "_segment_cache", viewer_series.OrderedDict())
+    return tmp_path
@@ -0,0 +1,84 @@
+import random
+from datetime import datetime, timezone
+import pytest
+import leaderboard_numpy
+import leaderboard_stats
+import stream_rollups
+import stream_store
+
+NOW = 1772323200  # 2026-03-01T00:00:00Z
+WINDOWS = (1, 7, 30)
+
+def iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def make_sessions(seed, count=300):
+    """PeerTube and Owncast rows over the last 40 days, with repeated durations, views and ends for ties."""
+    rng = random.Random(seed)
+    peertube, owncast = [], []
+    for i in range(count):
+        end = NOW - rng.choice([rng.randrange(40 * 86400), rng.randrange(4) * 43200])
+        start = end - rng.choice([600, 1800, 3600, rng.randrange(60, 30000)])
+        if rng.random() < 0.5:
+            peertube.append({"account_url": f"https://peertube.example/a/streamer{rng.randrange(12)}/video-channels",
+                             "published_at": iso(start), "retrieval_time": iso(end),
+                             "views": str(rng.choice([0, 5, 5, rng.randrange(100)])), "video_url": f"https://peertube.example/w/{i}"})
+        else:
+            owncast.append((f"https://owncast{rng.randrange(8)}.example/", iso(start), iso(end), "0"))
+    return peertube, owncast
+
+def store(peertube, owncast):
+    stream_store.upsert_peertube_sessions(peertube)
+    for row in owncast:
+        stream_store.add_owncast_session(*row)
+
+def expected(backend="python"):
+    sessions = leaderboard_stats.load_sessions(stream_store.load_peertube_sessions(), stream_store.load_owncast_sessions())
+    sessions.sort(key=leaderboard_stats.session_order)
+    return leaderboard_stats.compute_leaderboards(sessions, WINDOWS, NOW, backend)
+
+def test_rollups_match_the_single_pass():
+    store(*make_sessions(1))
+    result = stream_rollups.compute_leaderboards_from_rollups(WINDOWS, NOW)
+    assert result == expected()
+    # Same dict order too, the rankings sort stably on it
+    for days in WINDOWS:
+        for key in ("longest", "views", "shortest", "total_time", "count"):
+            assert list(result["windows"][days][key]) == list(expected()["windows"][days][key])
+    assert list(result["recent"]) == list(expected()["recent"])
+
+def test_incremental_updates_match_a_rebuild():
+    peertube, owncast = make_sessions(2)
+    store(peertube[:50], owncast[:50])
+    stream_rollups.rebuild_rollups()
+
+    for entry in peertube[50:]:
+        stream_rollups.update_buckets(stream_store.upsert_peertube_sessions([entry]))
+    # A PeerTube stream seen again later moves to the bucket of its new retrieval time
+    moved = dict(peertube[0], retrieval_time=iso(NOW - 3600), views="7")
+    stream_rollups.update_buckets(stream_store.upsert_peertube_sessions([moved]))
+    for row in owncast[50:]:
+        stream_store.add_owncast_session(*row)
+        stream_rollups.update_buckets([(row[0], row[2])])
+
+    incremental = stream_rollups.compute_leaderboards_from_rollups(WINDOWS, NOW)
+    stream_rollups.rebuild_rollups()
+    assert incremental == stream_rollups.compute_leaderboards_from_rollups(WINDOWS, NOW) == expected()
+
+def test_numpy_backend_matches():
+    if not leaderboard_numpy.available():
+        pytest.skip("numpy is not installed")
+    store(*make_sessions(3))
+    assert expected("numpy") == expected("python")
+
+def test_streams_longer_than_a_day_cover_every_hour():
+    # 2026-02-24 10:00 EST to 2026-02-26 11:00 EST, two whole days and an hour
+    start = NOW - 5 * 86400 + 15 * 3600
+    stream_store.add_owncast_session("https://owncast.example/", iso(start), iso(start + 2 * 86400 + 3600), "0")
+    stats = expected()["windows"][30]
+    assert stats["hour_counts"] == {h: 1 for h in range(24)}
+    assert stats["concurrent"][10 * 60] == 3 and stats["concurrent"][11 * 60 + 1] == 2
+    assert stats["coverage"] == [(0, 86400)]
+    assert stream_rollups.compute_leaderboards_from_rollups(WINDOWS, NOW) == expected()
+    if leaderboard_numpy.available():
+        assert expected("numpy") == expected()
@@ -0,0 +1,58 @@
+import time
+import pytest
+import mastodon_client
+import outbox
+import stream_store
+
+URL = "https://owncast.example/"
+PUBLISHED_AT = "2026-03-01T00:00:00Z"
+
+@pytest.fixture
+def posts(monkeypatch):
+    """Record the toots instead of posting them, failing while posts["fail"] is set."""
+    posts = {"sent": [], "marked": [], "fail": 0}
+    def status_post(message, **kwargs):
+        if posts["fail"]:
+            posts["fail"] -= 1
+            raise ConnectionError("instance down")
+        posts["sent"].append((message, kwargs["idempotency_key"]))
+    monkeypatch.setattr(mastodon_client, "status_post", status_post)
+    monkeypatch.setattr(outbox, "_on_sent", lambda url, published_at: posts["marked"].append((url, published_at)))
+    return posts
+
+def test_enqueue_once_per_stream(posts):
+    assert outbox.enqueue(URL, PUBLISHED_AT, "live!")
+    assert not outbox.enqueue(URL, PUBLISHED_AT, "live again!")
+    assert outbox.is_queued(URL, PUBLISHED_AT)
+    assert outbox.drain() == 1
+    assert posts["sent"] == [("live!", outbox.idempotency_key(URL, PUBLISHED_AT))]
+    assert posts["marked"] == [(URL, PUBLISHED_AT)]
+    assert outbox.drain() == 0
+
+def test_failed_post_is_retried_with_the_same_key(posts, monkeypatch):
+    outbox.enqueue(URL, PUBLISHED_AT, "live!")
+    posts["fail"] = 1
+    assert outbox.drain() == 0
+    assert posts["sent"] == [] and stream_store.next_outbox_attempt() > time.time()
+
+    later = time.time() + outbox.RETRY_DELAY * 2
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert outbox.drain() == 1
+    assert posts["sent"] == [("live!", outbox.idempotency_key(URL, PUBLISHED_AT))]
+
+def test_message_past_max_age_is_given_up(posts, monkeypatch):
+    outbox.enqueue(URL, PUBLISHED_AT, "live!")
+    later = time.time() + outbox.MAX_MESSAGE_AGE + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert outbox.drain() == 0
+    assert posts["sent"] == [] and stream_store.next_outbox_attempt() is None
+
+def test_retries_stay_inside_max_age():
+    total = sum(outbox.retry_delay(attempts) for attempts in range(1, outbox.MAX_ATTEMPTS))
+    assert total < outbox.MAX_MESSAGE_AGE
+
+def test_pending_messages_survive_a_restart(posts, monkeypatch):
+    outbox.enqueue(URL, PUBLISHED_AT, "live!")
+    monkeypatch.setattr(stream_store, "_connections", {})  # A new process opens the store again
+    assert outbox.drain() == 1
+    assert posts["sent"] == [("live!", outbox.idempotency_key(URL, PUBLISHED_AT))]
@@ -0,0 +1,73 @@
+import owncast_sessionizer
+import stream_store
+import viewer_series
+
+URL = "https://owncast.example/"
+
+def sample(timestamp, connect, disconnect, viewers=0):
+    return {"timestamp": timestamp, "owncast_url": URL, "last_connect_time": connect,
+            "last_disconnect_time": disconnect, "viewer_count": viewers}
+
+def run(samples):
+    open_sessions, last_disconnects, sessions = {}, {}, []
+    for s in samples:
+        sessions.extend(owncast_sessionizer.process_sample(open_sessions, last_disconnects, s))
+    return sessions
+
+def test_stream_between_two_polls_is_recorded():
+    sessions = run([
+        sample("2026-01-01T10:00:00Z", "2026-01-01T08:00:00Z", "2026-01-01T09:00:00Z"),
+        sample("2026-01-01T11:00:00Z", "2026-01-01T10:10:00Z", "2026-01-01T10:50:00Z"),
+    ])
+    assert sessions == [{
+        "owncast_url": URL,
+        "last_connect_time": "2026-01-01T10:10:00Z",
+        "last_disconnect_time": "2026-01-01T10:50:00Z",
+        "peak_viewers": 0,
+        "mean_viewers": 0,
+        "sample_count": 0,
+    }]
+
+def test_unchanged_offline_pair_is_not_repeated():
+    offline = sample("2026-01-01T10:00:00Z", "2026-01-01T08:00:00Z", "2026-01-01T09:00:00Z")
+    assert run([offline, dict(offline, timestamp="2026-01-01T11:00:00Z")]) == []
+
+def test_live_session_closes_once():
+    sessions = run([
+        sample("2026-01-01T10:00:00Z", "2026-01-01T08:00:00Z", "2026-01-01T09:00:00Z"),
+        sample("2026-01-01T11:00:00Z", "2026-01-01T10:30:00Z", "2026-01-01T09:00:00Z", 4),
+        sample("2026-01-01T12:00:00Z", "2026-01-01T10:30:00Z", "2026-01-01T11:40:00Z"),
+    ])
+    assert [(s["last_connect_time"], s["last_disconnect_time"], s["peak_viewers"]) for s in sessions] == [
+        ("2026-01-01T10:30:00Z", "2026-01-01T11:40:00Z", 4)]
+
+def test_stream_after_an_unclosed_one_keeps_its_own_times():
+    sessions = run([
+        sample("2026-01-01T10:00:00Z", "2026-01-01T08:00:00Z", "2026-01-01T09:00:00Z"),
+        sample("2026-01-01T11:00:00Z", "2026-01-01T10:30:00Z", "2026-01-01T09:00:00Z", 4),
+        sample("2026-01-01T13:00:00Z", "2026-01-01T12:00:00Z", "2026-01-01T12:30:00Z"),
+    ])
+    assert [(s["last_connect_time"], s["last_disconnect_time"]) for s in sessions] == [
+        ("2026-01-01T10:30:00Z", "2026-01-01T11:00:00Z"),
+        ("2026-01-01T12:00:00Z", "2026-01-01T12:30:00Z"),
+    ]
+
+def test_viewer_stats_come_from_the_series():
+    for minute, viewers in ((5, 2), (20, 9), (40, 4)):
+        viewer_series.append(URL, owncast_sessionizer.to_epoch("2026-01-01T10:00:00Z") + minute * 60, viewers)
+    viewer_series.append(URL, owncast_sessionizer.to_epoch("2026-01-01T12:00:00Z"), 0)  # The poll that saw it offline
+    sessions = run([
+        sample("2026-01-01T10:00:00Z", "2026-01-01T08:00:00Z", "2026-01-01T09:00:00Z"),
+        sample("2026-01-01T10:05:00Z", "2026-01-01T10:00:00Z", "2026-01-01T09:00:00Z", 2),
+        sample("2026-01-01T12:00:00Z", "2026-01-01T10:00:00Z", "2026-01-01T11:00:00Z"),
+    ])
+    assert [(s["peak_viewers"], s["mean_viewers"], s["sample_count"]) for s in sessions] == [(9, 5, 3)]
+
+def test_sessionize_keeps_the_baseline_across_runs():
+    emitted = []
+    emit = lambda url, disconnect, connect, viewers: emitted.append((connect, disconnect))
+    stream_store.add_owncast_sample("2026-01-01T10:00:00Z", URL, "2026-01-01T08:00:00Z", "2026-01-01T09:00:00Z", 0)
+    owncast_sessionizer.sessionize(emit)
+    stream_store.add_owncast_sample("2026-01-01T11:00:00Z", URL, "2026-01-01T10:10:00Z", "2026-01-01T10:50:00Z", 0)
+    owncast_sessionizer.sessionize(emit)
+    assert emitted == [("2026-01-01T10:10:00Z", "2026-01-01T10:50:00Z")]
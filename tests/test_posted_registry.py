@@ -0,0 +1,26 @@
+import time
+import posted_registry
+import stream_store
+
+URL = "https://peertube.example/a/streamer/video-channels"
+PUBLISHED_AT = "2026-03-01T00:00:00Z"
+NOW = 1772323200  # 2026-03-01T00:00:00Z
+
+def test_stream_live_past_retention_stays_posted(monkeypatch):
+    clock = [NOW + 3 * 86400]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    monkeypatch.setattr(posted_registry, "RETENTION_DAYS", 1)
+    monkeypatch.setattr(posted_registry, "_posted", None)
+    monkeypatch.setattr(posted_registry, "_last_compaction", 0)
+
+    # Still live three days after it started, longer than the retention window
+    posted_registry.mark_posted(URL, PUBLISHED_AT)
+    clock[0] += 3600
+    posted_registry.compact()
+    assert posted_registry.is_posted(URL, PUBLISHED_AT)
+
+    # Once the notification itself is older than the window it goes
+    clock[0] += 86400
+    posted_registry.compact()
+    assert not posted_registry.is_posted(URL, PUBLISHED_AT)
+    assert stream_store.load_posted_streams() == {}
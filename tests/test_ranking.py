@@ -0,0 +1,17 @@
+from ranking import pack_entries, paginate_ranking
+
+def format_entry(rank, item):
+    return f"{rank}. {item}\n\n"
+
+def test_oversized_first_entry_is_truncated():
+    header, footer = "Header\n\n", "#Footer"
+    parts, full = pack_entries(["x" * 100, "short"], format_entry, header, footer, 50, 2, 0)
+    assert parts[0].startswith(header + "1. xxx") and parts[0].endswith("…\n\n" + footer)
+    assert len(parts[0]) == 50
+    assert parts[1] == "2. short\n\n" + footer
+    assert not full
+
+def test_entries_fill_parts_in_rank_order():
+    parts = paginate_ranking({"a": 3, "b": 1, "c": 2}.items(), lambda x: x[1], lambda rank, item: f"{rank}. {item[0]}\n",
+                             "H\n", "F", 11, reverse=True, max_parts=2)
+    assert parts == ["H\n1. a\nF", "2. c\n3. b\nF"]
@@ -0,0 +1,31 @@
+import os
+import viewer_series
+
+URL = "https://owncast.example/"
+START = 1772323200  # 2026-03-01T00:00:00Z
+
+def test_round_trip():
+    samples = [(START + 60, 3), (START + 30, 1), (START + 3600, 250)]
+    for timestamp, viewers in samples:
+        viewer_series.append(URL, timestamp, viewers)
+    assert viewer_series.load(URL, START, START + 86400) == samples
+
+def test_torn_record_is_dropped_before_the_next_append():
+    viewer_series.append(URL, START + 60, 3)
+    path = viewer_series.segment_path(URL, START)
+    with open(path, "ab") as f:
+        f.write(b"\x02\x84")  # A crash after the first byte of a two byte record
+    viewer_series._last_timestamps.clear()  # As after a restart
+    assert viewer_series.load(URL, START, START + 86400) == [(START + 60, 3)]
+
+    viewer_series.append(URL, START + 120, 5)
+    assert viewer_series.load(URL, START, START + 86400) == [(START + 60, 3), (START + 120, 5)]
+    assert os.path.getsize(path) == 6
+
+def test_window_stats():
+    for i, viewers in enumerate([4, 1, 9, 2]):
+        viewer_series.append(URL, START + i * 60, viewers)
+    stats = viewer_series.window_stats(URL, START, START + 180)
+    assert stats == {"samples": 3, "first": START, "last": START + 120, "peak": 9,
+                     "mean": 14 / 3, "median": 4, "p95": 9}
+    assert viewer_series.window_stats(URL, START + 3600, START + 7200) is None